@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""Regenerate src/spake2/ed25519_constants.py.
+
+The built-in Ed25519 parameter set (and hash_params()) use a few
+arbitrary_element() seeds. Deriving each one takes a hash-to-curve search
+and several scalar multiplications, so we ship the results instead. Run
+this from the top of the source tree after changing the seeds or the
+derivation:
+
+    python misc/regenerate_ed25519_constants.py
+"""
+
+import os, sys
+from binascii import hexlify
+
+here = os.path.dirname(os.path.abspath(__file__))
+target = os.path.join(here, "..", "src", "spake2", "ed25519_constants.py")
+
+# b"" is used by hash_params(), the rest are the _Params defaults
+SEEDS = [b"", b"M", b"N", b"symmetric"]
+
+HEADER = '''\
+# This file is generated by misc/regenerate_ed25519_constants.py. Do not
+# edit it by hand. It maps arbitrary_element() seeds to the encoding of the
+# element that ed25519_basic.derive_arbitrary_element() produces for them.
+
+from binascii import unhexlify
+
+KNOWN_ARBITRARY_ELEMENTS = {
+'''
+
+def render(derive):
+    lines = [HEADER]
+    for seed in SEEDS:
+        encoded = hexlify(derive(seed).to_bytes()).decode("ascii")
+        lines.append('    %r:\n    unhexlify("%s"),\n' % (seed, encoded))
+    lines.append("}\n")
+    return "".join(lines)
+
+def main():
+    sys.path.insert(0, os.path.join(here, "..", "src"))
+    from spake2 import ed25519_basic
+    with open(target, "w") as f:
+        f.write(render(ed25519_basic.derive_arbitrary_element))
+
+if __name__ == "__main__":
+    main()
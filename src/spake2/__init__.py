@@ -1,6 +1,15 @@
-
-from .spake2 import SPAKE2_A, SPAKE2_B, SPAKE2_Symmetric, SPAKEError
+from .spake2 import (SPAKE2_A, SPAKE2_B, SPAKE2_Symmetric, SPAKEError,
+                     PreparedPassword, PreparedPasswordCache)
+from .pool import EphemeralPool
 SPAKE2_A, SPAKE2_B, SPAKE2_Symmetric, SPAKEError # hush pyflakes
+PreparedPassword, PreparedPasswordCache, EphemeralPool
 
-from . import _version
-__version__ = _version.get_versions()['version']
+def __getattr__(name):
+    # in a source checkout, looking up the version runs git, so wait until
+    # someone asks for it
+    if name == "__version__":
+        from . import _version
+        version = _version.get_versions()['version']
+        globals()["__version__"] = version
+        return version
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
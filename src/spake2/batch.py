@@ -0,0 +1,112 @@
+"""Helpers for applications that drive many SPAKE2 instances at once.
+
+The results are the same as calling the per-instance methods one at a time,
+but some of the work is shared between instances.
+"""
+
+import os
+from .spake2 import (SPAKE2_A, DefaultParams, PreparedPassword, SPAKEError,
+                     ReflectionThwarted, OnlyCallStartOnce)
+
+def start_all(instances):
+    """Call start() on each SPAKE2_A/SPAKE2_B/SPAKE2_Symmetric instance.
+
+    Returns the list of outbound messages, in the same order. The instances
+    may use different params. For the Ed25519 group, encoding the messages
+    shares a single field inversion across the whole batch.
+    """
+    # check them all first, so that one bad instance doesn't leave the
+    # others marked as started without an outbound message
+    for s in instances:
+        if s._started:
+            raise OnlyCallStartOnce("start() can only be called once")
+    elements = []
+    try:
+        for s in instances:
+            elements.append(s._start_element())
+    except BaseException:
+        # (e.g. the same instance twice, or entropy_f failed): the one that
+        # raised wasn't started, so un-start the ones before it
+        for s in instances[:len(elements)]:
+            s._started = False
+        raise
+    by_group = {}
+    for (s, e) in zip(instances, elements):
+        by_group.setdefault(id(s.params.group), []).append((s, e))
+    for pairs in by_group.values():
+        g = pairs[0][0].params.group
+        encoded = g.elements_to_bytes([e for (_, e) in pairs])
+        for ((s, _), b) in zip(pairs, encoded):
+            s.outbound_message = b
+    return [s._outbound_side_and_message() for s in instances]
+
+def start_many(passwords, klass=SPAKE2_A, params=DefaultParams,
+               entropy_f=os.urandom, pool=None, **kwargs):
+    """Create a klass instance for each password (bytes or PreparedPassword)
+    and start them all, with start_all().
+
+    Returns a list of instances and a list of their outbound messages.
+    Any other keyword arguments (like idA= and idB=) are passed to every
+    instance. A password that appears more than once in the batch is
+    prepared once and shared, as if it had been a PreparedPassword.
+    """
+    counts = {}
+    for pw in passwords:
+        if isinstance(pw, bytes):
+            counts[pw] = counts.get(pw, 0) + 1
+    prepared = dict((pw, PreparedPassword(pw, params))
+                    for (pw, count) in counts.items() if count > 1)
+    instances = [klass(prepared.get(pw, pw) if isinstance(pw, bytes) else pw,
+                       params=params, entropy_f=entropy_f, pool=pool,
+                       **kwargs)
+                 for pw in passwords]
+    return instances, start_all(instances)
+
+def finish_many(instances, inbound_messages, entropy_f=os.urandom):
+    """Call finish() on each started instance, with the matching inbound
+    message.
+
+    Returns a list with one entry per instance: the shared key, or the
+    exception that finish() would have raised for that instance (OffSides,
+    ReflectionThwarted, OnlyCallFinishOnce, FinishedTooEarly,
+    ValueError/NotOnCurve for a bad encoding, or TypeError for a message
+    that isn't bytes-like). One bad message does not affect the others.
+    Inbound elements are checked for group membership as a batch (using
+    entropy_f), and for the Ed25519 group, encoding them and the shared
+    secrets costs one field inversion per batch instead of one per
+    instance.
+    """
+    assert len(instances) == len(inbound_messages)
+    results = [None] * len(instances)
+    by_group = {}
+    for (n, (s, msg)) in enumerate(zip(instances, inbound_messages)):
+        try:
+            s.inbound_message = s._begin_finish(msg)
+        except (SPAKEError, TypeError, ValueError) as e:
+            results[n] = e
+            continue
+        by_group.setdefault(id(s.params.group), []).append(n)
+    for todo in by_group.values():
+        g = instances[todo[0]].params.group
+        decoded = g.bytes_to_elements_verified(
+            [instances[n].inbound_message for n in todo], entropy_f,
+            return_exceptions=True)
+        inbound = []
+        for (n, e) in zip(todo, decoded):
+            if isinstance(e, Exception):
+                results[n] = e
+            else:
+                inbound.append((n, e))
+        # non-canonical encodings need their canonical form for the
+        # reflection check, so share that inversion too
+        g.elements_to_bytes([e for (_, e) in inbound])
+        K_elems = []
+        for (n, e) in inbound:
+            try:
+                K_elems.append((n, instances[n]._K_element(e)))
+            except ReflectionThwarted as err:
+                results[n] = err
+        K_bytes = g.elements_to_bytes([K for (_, K) in K_elems])
+        for ((n, _), K) in zip(K_elems, K_bytes):
+            results[n] = instances[n]._finalize(K)
+    return results
@@ -1,5 +1,8 @@
-import binascii, hashlib, itertools
-from .groups import expand_arbitrary_element_seed
+import os, hashlib, itertools
+from .groups import (expand_arbitrary_element_seed, check_members,
+                     LazyFixedBaseTable, MAX_FIXED_BASE_WINDOW)
+from .util import bytes_to_number
+from .ed25519_constants import KNOWN_ARBITRARY_ELEMENTS
 
 Q = 2**255 - 19
 L = 2**252 + 27742317777372353535851937790883648493
@@ -7,14 +10,45 @@ L = 2**252 + 27742317777372353535851937790883648493
 def inv(x):
     return pow(x, Q-2, Q)
 
+def batch_inv(xs):
+    # [inv(x) for x in xs] with a single inversion (Montgomery's trick):
+    # invert the product of everything, then peel off one factor at a time
+    prefixes = []
+    acc = 1
+    for x in xs:
+        prefixes.append(acc)
+        acc = (acc * x) % Q
+    acc = inv(acc)
+    inverses = [None] * len(xs)
+    for i in reversed(range(len(xs))):
+        inverses[i] = (acc * prefixes[i]) % Q
+        acc = (acc * xs[i]) % Q
+    return inverses
+
 d = -121665 * inv(121666)
 I = pow(2,(Q-1)//4,Q)
 
+def sqrt_ratio(u, v):
+    # Returns some x with v*x^2 == u (mod Q), or None if u/v is not a
+    # square. This takes a single exponentiation, instead of an inversion
+    # followed by a square root: x = u*v^3 * (u*v^7)^((Q-5)/8), which is
+    # correct up to a factor of sqrt(-1).
+    v3 = (v*v*v) % Q
+    x = (u * v3 * pow(u*v3*v3*v, (Q-5)//8, Q)) % Q
+    vxx = (v*x*x) % Q
+    if vxx == u % Q:
+        return x
+    if vxx == (-u) % Q:
+        return (x*I) % Q
+    return None
+
 def xrecover(y):
-    xx = (y*y-1) * inv(d*y*y+1)
-    x = pow(xx,(Q+3)//8,Q)
-    if (x*x - xx) % Q != 0: x = (x*I) % Q
-    if x % 2 != 0: x = Q-x
+    # the even x for which (x,y) is on the curve, or None if there isn't
+    # one: -x^2 + y^2 = 1 + d*x^2*y^2, so x^2 = (y^2-1) / (d*y^2+1)
+    yy = y*y
+    x = sqrt_ratio(yy-1, d*yy+1)
+    if x is not None and x % 2 != 0:
+        x = Q-x
     return x
 
 By = 4 * inv(5)
@@ -23,6 +57,24 @@ B = [Bx % Q,By % Q]
 
 # Extended Coordinates: x=X/Z, y=Y/Z, x*y=T/Z
 # http://www.hyperelliptic.org/EFD/g1p/auto-twisted-extended-1.html
+#
+# Inside the scalarmult loops we also use three other representations (the
+# same set as the ref10 Ed25519 code), so that each step only computes what
+# the next step will read:
+#
+#  projective (X,Y,Z): extended without T. That's all a doubling needs.
+#  completed (E,F,G,H): the output of a doubling or addition before its
+#   final multiplications, x=E/G and y=H/F. It costs 3 multiplications to
+#   get projective from this, or 4 to get extended.
+#  cached (Y+X, Y-X, 2*Z, 2*d*T): the second operand of an addition, with
+#   everything that depends only on that point done ahead of time. All
+#   table entries are kept in this form.
+#
+# The addition formula (add-2008-hwcd-3) is unified, so it works for every
+# pair of points, including P+P and P+Zero. With a cached second operand it
+# costs the same as the non-unified one, so we use it everywhere.
+
+d2 = (2*d) % Q
 
 def xform_affine_to_extended(pt):
     (x, y) = pt
@@ -30,85 +82,215 @@ def xform_affine_to_extended(pt):
 
 def xform_extended_to_affine(pt):
     (x, y, z, _) = pt
-    return ((x*inv(z))%Q, (y*inv(z))%Q)
+    zi = inv(z)
+    return ((x*zi)%Q, (y*zi)%Q)
 
-def double_element(pt): # extended->extended
+def _completed_to_projective(c):
+    (E, F, G, H) = c
+    return ((E*F) % Q, (G*H) % Q, (F*G) % Q)
+
+def _completed_to_extended(c):
+    (E, F, G, H) = c
+    return ((E*F) % Q, (G*H) % Q, (F*G) % Q, (E*H) % Q)
+
+def _extended_to_cached(pt):
+    (X, Y, Z, T) = pt
+    return ((Y+X) % Q, (Y-X) % Q, (2*Z) % Q, (d2*T) % Q)
+
+def _negate_cached(c):
+    # -(x,y) = (-x,y), which swaps Y+X with Y-X, and negates T
+    (YpX, YmX, Z2, T2d) = c
+    return (YmX, YpX, Z2, (-T2d) % Q)
+
+def _double_completed(X1, Y1, Z1): # projective->completed
     # dbl-2008-hwcd
-    (X1, Y1, Z1, _) = pt
-    A = (X1*X1)
-    B = (Y1*Y1)
-    C = (2*Z1*Z1)
-    D = (-A) % Q
-    J = (X1+Y1) % Q
-    E = (J*J-A-B) % Q
-    G = (D+B) % Q
+    A = (X1*X1) % Q
+    B = (Y1*Y1) % Q
+    C = (2*Z1*Z1) % Q
+    E = ((X1+Y1)*(X1+Y1) - A - B) % Q
+    G = (B-A) % Q
     F = (G-C) % Q
-    H = (D-B) % Q
-    X3 = (E*F) % Q
-    Y3 = (G*H) % Q
-    Z3 = (F*G) % Q
-    T3 = (E*H) % Q
-    return (X3, Y3, Z3, T3)
+    H = (-A-B) % Q
+    return (E, F, G, H)
+
+def _add_completed(pt, c): # extended+cached->completed
+    # add-2008-hwcd-3
+    (X1, Y1, Z1, T1) = pt
+    (YpX2, YmX2, Z2x2, T2d2) = c
+    A = ((Y1-X1)*YmX2) % Q
+    B = ((Y1+X1)*YpX2) % Q
+    C = (T1*T2d2) % Q
+    D = (Z1*Z2x2) % Q
+    return ((B-A) % Q, (D-C) % Q, (D+C) % Q, (B+A) % Q)
+
+def double_element(pt): # extended->extended
+    (X1, Y1, Z1, _) = pt
+    return _completed_to_extended(_double_completed(X1, Y1, Z1))
 
 def add_elements(pt1, pt2): # extended->extended
-    # add-2008-hwcd-3 . Slightly slower than add-2008-hwcd-4, but -3 is
-    # unified, so it's safe for general-purpose addition
-    (X1, Y1, Z1, T1) = pt1
-    (X2, Y2, Z2, T2) = pt2
-    A = ((Y1-X1)*(Y2-X2)) % Q
-    B = ((Y1+X1)*(Y2+X2)) % Q
-    C = T1*(2*d)*T2 % Q
-    D = Z1*2*Z2 % Q
-    E = (B-A) % Q
-    F = (D-C) % Q
-    G = (D+C) % Q
-    H = (B+A) % Q
-    X3 = (E*F) % Q
-    Y3 = (G*H) % Q
-    T3 = (E*H) % Q
-    Z3 = (F*G) % Q
-    return (X3, Y3, Z3, T3)
-
-def scalarmult_element_safe_slow(pt, n):
-    # this form is slightly slower, but tolerates arbitrary points, including
-    # those which are not in the main 1*L subgroup. This includes points of
-    # order 1 (the neutral element Zero), 2, 4, and 8.
-    assert n >= 0
-    if n==0:
-        return xform_affine_to_extended((0,1))
-    _ = double_element(scalarmult_element_safe_slow(pt, n>>1))
-    return add_elements(_, pt) if n&1 else _
-
-def _add_elements_nonunfied(pt1, pt2): # extended->extended
-    # add-2008-hwcd-4 : NOT unified, only for pt1!=pt2. About 10% faster than
-    # the (unified) add-2008-hwcd-3, and safe to use inside scalarmult if you
-    # aren't using points of order 1/2/4/8
-    (X1, Y1, Z1, T1) = pt1
-    (X2, Y2, Z2, T2) = pt2
-    A = ((Y1-X1)*(Y2+X2)) % Q
-    B = ((Y1+X1)*(Y2-X2)) % Q
-    C = (Z1*2*T2) % Q
-    D = (T1*2*Z2) % Q
-    E = (D+C) % Q
-    F = (B-A) % Q
-    G = (B+A) % Q
-    H = (D-C) % Q
-    X3 = (E*F) % Q
-    Y3 = (G*H) % Q
-    Z3 = (F*G) % Q
-    T3 = (E*H) % Q
-    return (X3, Y3, Z3, T3)
+    return _completed_to_extended(_add_completed(pt1,
+                                                 _extended_to_cached(pt2)))
+
+def negate_element(pt): # extended->extended
+    (X, Y, Z, T) = pt
+    return ((-X) % Q, Y, Z, (-T) % Q)
 
 def scalarmult_element(pt, n): # extended->extended
-    # This form only works properly when given points that are a member of
-    # the main 1*L subgroup. It will give incorrect answers when called with
-    # the points of order 1/2/4/8, including point Zero. (it will also work
-    # properly when given points of order 2*L/4*L/8*L)
+    # Since the addition formula is unified, this works for any point,
+    # including ones outside the main 1*L subgroup, like those of order
+    # 1 (the neutral element Zero), 2, 4, and 8.
     assert n >= 0
-    if n==0:
+    return _multi_scalarmult_wnaf([(n, pt)])
+
+# this used to be a separate, slower, unified-formula ladder
+scalarmult_element_safe_slow = scalarmult_element
+
+# Variable-base scalar multiplication uses a width-w NAF: the scalar is
+# rewritten with odd digits in -2^(w-1)..2^(w-1), each non-zero digit
+# followed by at least w-1 zeros. We precompute the odd multiples P, 3P, ..,
+# (2^(w-1)-1)P, then walk the digits from the top: one doubling per bit, and
+# one addition per non-zero digit (about bits/(w+1) of them, instead of
+# bits/2 for plain double-and-add).
+#
+# Several scalarmults that are going to be added together can share a
+# single doubling chain (Straus' trick): walk all of their digits at once,
+# and add the entries for every term at each bit.
+
+WNAF_WINDOW = 5
+
+def _wnaf(n, w):
+    # least-significant digit first
+    digits = []
+    while n:
+        if n & 1:
+            d = n & ((1 << w) - 1)
+            if d >= (1 << (w-1)):
+                d -= 1 << w
+            n -= d
+        else:
+            d = 0
+        digits.append(d)
+        n >>= 1
+    return digits
+
+def _odd_multiples(pt, w): # extended->[cached]
+    twice = _extended_to_cached(double_element(pt))
+    multiple = pt
+    odd_multiples = [_extended_to_cached(pt)] # [1P, 3P, 5P, ..]
+    for _ in range((1 << (w-2)) - 1):
+        multiple = _completed_to_extended(_add_completed(multiple, twice))
+        odd_multiples.append(_extended_to_cached(multiple))
+    return odd_multiples
+
+def _multi_scalarmult_wnaf(terms, w=WNAF_WINDOW): # [(n,extended)]->extended
+    return _wnaf_ladder([(_wnaf(n, w), _odd_multiples(pt, w))
+                         for (n, pt) in terms if n])
+
+def _wnaf_ladder(columns): # [(digits,[cached])]->extended
+    if not columns:
         return xform_affine_to_extended((0,1))
-    _ = double_element(scalarmult_element(pt, n>>1))
-    return _add_elements_nonunfied(_, pt) if n&1 else _
+    acc = None # completed, once we've seen the first non-zero digit
+    for i in reversed(range(max(len(digits) for (digits, _) in columns))):
+        if acc is not None:
+            acc = _double_completed(*_completed_to_projective(acc))
+        for (digits, odd_multiples) in columns:
+            if i >= len(digits) or digits[i] == 0:
+                continue
+            d = digits[i]
+            if d > 0:
+                entry = odd_multiples[d >> 1]
+            else:
+                entry = _negate_cached(odd_multiples[(-d) >> 1])
+            if acc is None:
+                acc = _add_completed((0, 1, 1, 0), entry)
+            else:
+                acc = _add_completed(_completed_to_extended(acc), entry)
+    return _completed_to_extended(acc)
+
+# Subgroup membership: P is in the main 1*L subgroup iff L*P is Zero. Since
+# the exponent never changes, its wNAF is worked out once. L = 2^252 + c
+# with c only 125 bits long, so the w=4 recoding has a lone top digit, then
+# 127 zeros, then 26 more non-zero digits. That makes this mostly a long
+# run of doublings, which the ladder does in projective form. The point
+# might be of any order, but that's fine with the unified additions.
+
+_L_WNAF_WINDOW = 4
+_L_WNAF = _wnaf(L, _L_WNAF_WINDOW) # least-significant digit first
+
+def is_in_main_subgroup(pt): # extended->bool
+    odd_multiples = _odd_multiples(pt, _L_WNAF_WINDOW)
+    return is_extended_zero(_wnaf_ladder([(_L_WNAF, odd_multiples)]))
+
+# Fixed-base scalar multiplication. For a point that gets multiplied over
+# and over (like Base), we precompute d*2^(w*i)*P for every window i and
+# every digit 1<=d<=2^(w-1). Writing the scalar in signed radix-2^w (digits
+# in -2^(w-1)..2^(w-1)-1) then turns scalarmult into one table lookup and
+# one addition per window, with no doublings at all. For w=4 that is 64
+# windows of 8 entries, and at most 64 additions.
+
+FIXED_BASE_WINDOW = 4
+# each table entry is a tuple of four field elements: about 320 bytes in
+# CPython
+FIXED_BASE_ENTRY_BYTES = 320
+
+def _fixed_base_windows(w):
+    # leave at least one bit of headroom for the carry out of the top digit
+    return (L.bit_length() + w) // w
+
+def fixed_base_table_bytes(w):
+    return _fixed_base_windows(w) * (1 << (w-1)) * FIXED_BASE_ENTRY_BYTES
+
+def fixed_base_window(max_bytes):
+    # the widest window whose table fits in max_bytes, or None if even the
+    # narrowest one doesn't
+    best = None
+    for w in range(2, MAX_FIXED_BASE_WINDOW+1):
+        if fixed_base_table_bytes(w) <= max_bytes:
+            best = w
+    return best
+
+def _signed_digits(n, w, count):
+    half = 1 << (w-1)
+    mask = (1 << w) - 1
+    digits = []
+    for _ in range(count):
+        d = n & mask
+        n >>= w
+        if d >= half:
+            d -= 1 << w
+            n += 1 # borrow from the next window
+        digits.append(d)
+    assert n == 0
+    return digits
+
+def precompute_fixed_base(pt, w=FIXED_BASE_WINDOW): # extended->table
+    assert w >= 2 # signed digits need at least two bits
+    table = []
+    row_base = pt
+    for _ in range(_fixed_base_windows(w)):
+        cached_base = _extended_to_cached(row_base)
+        row = [row_base]
+        for _ in range((1 << (w-1)) - 1):
+            row.append(_completed_to_extended(_add_completed(row[-1],
+                                                             cached_base)))
+        table.append([_extended_to_cached(entry) for entry in row])
+        # the last entry is 2^(w-1)*row_base, so one doubling gets us to
+        # 2^w*row_base, the base for the next window
+        row_base = double_element(row[-1])
+    return table
+
+def scalarmult_fixed_base(table, n): # table->extended
+    # n must already be reduced modulo L
+    assert 0 <= n < L
+    w = len(table[0]).bit_length()
+    acc = xform_affine_to_extended((0,1))
+    for row, d in zip(table, _signed_digits(n, w, len(table))):
+        if d > 0:
+            acc = _completed_to_extended(_add_completed(acc, row[d-1]))
+        elif d < 0:
+            acc = _completed_to_extended(_add_completed(
+                acc, _negate_cached(row[-d-1])))
+    return acc
 
 # points are encoded as 32-bytes little-endian, b255 is sign, b2b1b0 are 0
 
@@ -120,7 +302,7 @@ def encodepoint(P):
     assert 0 <= y < (1<<255) # always < 0x7fff..ff
     if x & 1:
         y += 1<<255
-    return binascii.unhexlify(("%064x" % y).encode("ascii"))[::-1]
+    return y.to_bytes(32, "little")
 
 def isoncurve(P):
     x = P[0]
@@ -131,20 +313,21 @@ class NotOnCurve(Exception):
     pass
 
 def decodepoint(s):
-    unclamped = int(binascii.hexlify(s[:32][::-1]), 16)
+    # s can be any bytes-like object, and is read without copying
+    unclamped = int.from_bytes(memoryview(s)[:32], "little")
     clamp = (1 << 255) - 1
     y = unclamped & clamp # clear MSB
-    x = xrecover(y)
+    x = xrecover(y) # this is also the on-curve check
+    if x is None: raise NotOnCurve("decoding point that is not on curve")
     if bool(x & 1) != bool(unclamped & (1<<255)): x = Q-x
     P = [x,y]
-    if not isoncurve(P): raise NotOnCurve("decoding point that is not on curve")
     return P
 
 # scalars are encoded as 32-bytes little-endian
 
 def bytes_to_scalar(s):
     assert len(s) == 32, len(s)
-    return int(binascii.hexlify(s[::-1]), 16)
+    return int.from_bytes(s, "little")
 
 def bytes_to_clamped_scalar(s):
     # Ed25519 private keys clamp the scalar to ensure two things:
@@ -161,7 +344,7 @@ def bytes_to_clamped_scalar(s):
 
 def random_scalar(entropy_f): # 0..L-1 inclusive
     # reduce the bias to a safe level by generating 256 extra bits
-    oversized = int(binascii.hexlify(entropy_f(32+32)), 16)
+    oversized = int.from_bytes(entropy_f(32+32), "big")
     return oversized % L
 
 # unused, in favor of common HKDF approach in groups.py
@@ -171,8 +354,7 @@ def random_scalar(entropy_f): # 0..L-1 inclusive
 
 def scalar_to_bytes(y):
     y = y % L
-    assert 0 <= y < 2**256
-    return binascii.unhexlify(("%064x" % y).encode("ascii"))[::-1]
+    return y.to_bytes(32, "little")
 
 # Elements, of various orders
 
@@ -187,10 +369,13 @@ def is_extended_zero(XYTZ):
 
 class ElementOfUnknownGroup:
     # This is used for points of order 2,4,8,2*L,4*L,8*L
-    def __init__(self, XYTZ):
+    def __init__(self, XYTZ, encoding=None):
         assert isinstance(XYTZ, tuple)
         assert len(XYTZ) == 4
         self.XYTZ = XYTZ
+        # Encoding needs an inversion, so we remember the result (or the
+        # canonical bytes this element was decoded from).
+        self._bytes = encoding
 
     def add(self, other):
         if not isinstance(other, ElementOfUnknownGroup):
@@ -204,13 +389,29 @@ class ElementOfUnknownGroup:
         if isinstance(s, ElementOfUnknownGroup):
             raise TypeError("elements cannot be multiplied together")
         assert s >= 0
-        product = scalarmult_element_safe_slow(self.XYTZ, s)
+        product = scalarmult_element(self.XYTZ, s)
         return ElementOfUnknownGroup(product)
 
+    # negation is cheap on twisted Edwards curves: -(x,y) = (-x,y)
+    def negate(self):
+        return ElementOfUnknownGroup(negate_element(self.XYTZ))
+    def subtract(self, other):
+        return self.add(other.negate())
+
     def to_bytes(self):
-        return encodepoint(xform_extended_to_affine(self.XYTZ))
+        if self._bytes is None:
+            self._bytes = encodepoint(xform_extended_to_affine(self.XYTZ))
+        return self._bytes
     def __eq__(self, other):
-        return self.to_bytes() == other.to_bytes()
+        if not isinstance(other, ElementOfUnknownGroup):
+            return NotImplemented
+        if self._bytes is not None and other._bytes is not None:
+            return self._bytes == other._bytes
+        # compare x1/z1 with x2/z2 (and the same for y) without inverting
+        (X1, Y1, Z1, _) = self.XYTZ
+        (X2, Y2, Z2, _) = other.XYTZ
+        return ((X1*Z2 - X2*Z1) % Q == 0 and
+                (Y1*Z2 - Y2*Z1) % Q == 0)
     def __ne__(self, other):
         return not self == other
 
@@ -235,7 +436,7 @@ class Element(ElementOfUnknownGroup):
         if isinstance(s, ElementOfUnknownGroup):
             raise TypeError("elements cannot be multiplied together")
         # scalarmult of subgroup members can be done modulo the subgroup
-        # order, and using the faster non-unified function.
+        # order
         s = s % L
         # scalarmult(s=0) gets you Zero
         if s == 0:
@@ -244,12 +445,9 @@ class Element(ElementOfUnknownGroup):
         # scalarmult(s<grouporder) gets you a different subgroup member
         return Element(scalarmult_element(self.XYTZ, s))
 
-    # negation and subtraction only make sense for the main subgroup
     def negate(self):
-        # slow. Prefer e.scalarmult(-pw) to e.scalarmult(pw).negate()
-        return Element(scalarmult_element(self.XYTZ, L-2))
-    def subtract(self, other):
-        return self.add(other.negate())
+        # the negation of a subgroup member is a subgroup member
+        return Element(negate_element(self.XYTZ))
 
 class _ZeroElement(ElementOfUnknownGroup):
     def add(self, other):
@@ -261,31 +459,111 @@ class _ZeroElement(ElementOfUnknownGroup):
     def subtract(self, other):
         return self.add(other.negate())
 
+class FixedBaseElement(LazyFixedBaseTable, Element):
+    # a main-subgroup element that we expect to multiply many times. Until
+    # its table is built (see LazyFixedBaseTable), scalarmult() uses the
+    # ladder.
+    def __init__(self, XYTZ, w=FIXED_BASE_WINDOW):
+        Element.__init__(self, XYTZ)
+        self._w = w
 
-Base = Element(xform_affine_to_extended(B))
+    def _compute_table(self):
+        return precompute_fixed_base(self.XYTZ, self._w)
+
+    def scalarmult(self, s):
+        if isinstance(s, ElementOfUnknownGroup):
+            raise TypeError("elements cannot be multiplied together")
+        s = s % L
+        if s == 0:
+            return Zero
+        table = self._get_table()
+        if table is None:
+            return Element(scalarmult_element(self.XYTZ, s))
+        return Element(scalarmult_fixed_base(table, s))
+
+
+Base = FixedBaseElement(xform_affine_to_extended(B))
 Zero = _ZeroElement(xform_affine_to_extended((0,1))) # the neutral (identity) element
 
 _zero_bytes = Zero.to_bytes()
 
 
+def multi_scalarmult(pairs):
+    # sum(e.scalarmult(s) for (s,e) in pairs), but faster: every fixed-base
+    # element with a table uses it, and the remaining terms share a single
+    # doubling chain.
+    unknown = False
+    terms = []
+    XYTZ = xform_affine_to_extended((0,1))
+    for (s, e) in pairs:
+        if isinstance(s, ElementOfUnknownGroup):
+            raise TypeError("elements cannot be multiplied together")
+        if not isinstance(e, ElementOfUnknownGroup):
+            raise TypeError("scalars can only multiply elements")
+        if e is Zero:
+            continue
+        if isinstance(e, Element):
+            s = s % L
+        else:
+            assert s >= 0
+            unknown = True
+        if s == 0:
+            continue
+        table = e._get_table() if isinstance(e, FixedBaseElement) else None
+        if table is not None:
+            XYTZ = add_elements(XYTZ, scalarmult_fixed_base(table, s))
+        else:
+            terms.append((s, e.XYTZ))
+    if terms:
+        XYTZ = add_elements(XYTZ, _multi_scalarmult_wnaf(terms))
+    if is_extended_zero(XYTZ):
+        return Zero
+    if unknown:
+        return ElementOfUnknownGroup(XYTZ)
+    return Element(XYTZ)
+
+def elements_to_bytes(elements):
+    # [e.to_bytes() for e in elements], but every element that hasn't been
+    # encoded yet shares a single inversion
+    todo = [e for e in elements if e._bytes is None]
+    for e, zi in zip(todo, batch_inv([e.XYTZ[2] for e in todo])):
+        (X, Y, _, _) = e.XYTZ
+        e._bytes = encodepoint(((X*zi) % Q, (Y*zi) % Q))
+    return [e.to_bytes() for e in elements]
+
 def arbitrary_element(seed): # unknown DL
+    # The built-in parameter sets use a handful of seeds, whose elements
+    # are derived ahead of time (by misc/regenerate_ed25519_constants.py)
+    # so that nobody pays for the search below at runtime.
+    # check_known_arbitrary_elements() re-derives them.
+    known = KNOWN_ARBITRARY_ELEMENTS.get(seed)
+    if known is not None:
+        return Element(xform_affine_to_extended(decodepoint(known)), known)
+    return derive_arbitrary_element(seed)
+
+def check_known_arbitrary_elements():
+    for (seed, known) in sorted(KNOWN_ARBITRARY_ELEMENTS.items()):
+        if derive_arbitrary_element(seed).to_bytes() != known:
+            raise ValueError("precomputed element for seed %r is wrong"
+                             % (seed,))
+
+def derive_arbitrary_element(seed):
     # We don't strictly need the uniformity provided by hashing to an
     # oversized string (128 bits more than the field size), then reducing
     # down to Q. But it's comforting, and it's the same technique we use for
     # converting passwords/seeds to scalars (which *does* need uniformity).
     hseed = expand_arbitrary_element_seed(seed, int((256/8)+16))
-    y = int(binascii.hexlify(hseed), 16) % Q
+    y = bytes_to_number(hseed) % Q
 
     # we try successive Y values until we find a valid point
     for plus in itertools.count(0):
         y_plus = (y + plus) % Q
         x = xrecover(y_plus)
-        Pa = [x,y_plus] # no attempt to use both "positive" and "negative" X
-
         # only about 50% of Y coordinates map to valid curve points (I think
         # the other half give you points on the "twist").
-        if not isoncurve(Pa):
+        if x is None:
             continue
+        Pa = [x,y_plus] # no attempt to use both "positive" and "negative" X
 
         P = ElementOfUnknownGroup(xform_affine_to_extended(Pa))
         # even if the point is on our curve, it may not be in our particular
@@ -325,27 +603,66 @@ def arbitrary_element(seed): # unknown DL
         # Test that we're finally in the right group. We want to scalarmult
         # by L, and we want to *not* use the trick in Group.scalarmult()
         # which does x%L, because that would bypass the check we care about.
-        # P is still an _ElementOfUnknownGroup, which doesn't use x%L because
-        # that's not correct for points outside the main group.
-        assert is_extended_zero(P8.scalarmult(L).XYTZ)
+        # is_in_main_subgroup() multiplies by the real L, using formulas
+        # that are correct for points outside the main group.
+        assert is_in_main_subgroup(P8.XYTZ)
 
         return Element(P8.XYTZ)
     # never reached
 
-def bytes_to_unknown_group_element(bytes):
-    # this accepts all elements, including Zero and wrong-subgroup ones
-    if bytes == _zero_bytes:
+def bytes_to_unknown_group_element(s):
+    # this accepts all elements, including Zero and wrong-subgroup ones. s
+    # can be any bytes-like object.
+    if s == _zero_bytes:
         return Zero
-    XYTZ = xform_affine_to_extended(decodepoint(bytes))
-    return ElementOfUnknownGroup(XYTZ)
-
-def bytes_to_element(bytes):
+    P = decodepoint(s)
+    XYTZ = xform_affine_to_extended(P)
+    # decodepoint() tolerates non-canonical encodings (y >= Q, "negative"
+    # zero x, or trailing bytes). Only remember the ones that to_bytes()
+    # would have produced itself.
+    # A memoryview is copied here (bytes() of a bytes object is free), since
+    # the caller's buffer might be reused after we return.
+    canonical = len(s) == 32 and P[0] < Q and P[1] < Q
+    return ElementOfUnknownGroup(XYTZ, bytes(s) if canonical else None)
+
+def bytes_to_element(s):
     # this strictly only accepts elements in the right subgroup
-    P = bytes_to_unknown_group_element(bytes)
+    P = bytes_to_unknown_group_element(s)
     if P is Zero:
         raise ValueError("element was Zero")
-    if not is_extended_zero(P.scalarmult(L).XYTZ):
+    if not is_in_main_subgroup(P.XYTZ):
         raise ValueError("element is not in the right group")
     # the point is in the expected 1*L subgroup, not in the 2/4/8 groups,
     # or in the 2*L/4*L/8*L groups. Promote it to a correct-group Element.
-    return Element(P.XYTZ)
+    return Element(P.XYTZ, P._bytes)
+
+def bytes_to_elements_verified(bs, entropy_f=os.urandom,
+                               return_exceptions=False):
+    # [bytes_to_element(b) for b in bs], with the subgroup checks done as a
+    # batch (see groups.check_members). With return_exceptions=True, each
+    # bad encoding gets the exception that bytes_to_element() would have
+    # raised for it, in place of its element, and nothing is raised.
+    results = []
+    for b in bs:
+        try:
+            P = bytes_to_unknown_group_element(b)
+            if P is Zero:
+                raise ValueError("element was Zero")
+        except (ValueError, NotOnCurve) as e:
+            if not return_exceptions:
+                raise
+            P = e
+        results.append(P)
+    todo = [i for (i, P) in enumerate(results)
+            if not isinstance(P, Exception)]
+    ok = check_members([results[i].XYTZ for i in todo], is_in_main_subgroup,
+                       add_elements, Zero.XYTZ, entropy_f)
+    for (i, good) in zip(todo, ok):
+        P = results[i]
+        if good:
+            results[i] = Element(P.XYTZ, P._bytes)
+        elif return_exceptions:
+            results[i] = ValueError("element is not in the right group")
+        else:
+            raise ValueError("element %d is not in the right group" % i)
+    return results
@@ -0,0 +1,16 @@
+# This file is generated by misc/regenerate_ed25519_constants.py. Do not
+# edit it by hand. It maps arbitrary_element() seeds to the encoding of the
+# element that ed25519_basic.derive_arbitrary_element() produces for them.
+
+from binascii import unhexlify
+
+KNOWN_ARBITRARY_ELEMENTS = {
+    b'':
+    unhexlify("f89aa1f20de65437ae8985892b02c6ddd35752435cc9466c567134e7cfef360b"),
+    b'M':
+    unhexlify("15cfd18e385952982b6a8f8c7854963b58e34388c8e6dae891db756481a02312"),
+    b'N':
+    unhexlify("f04f2e7eb734b2a8f8b472eaf9c3c632576ac64aea650b496a8a20ff00e583c3"),
+    b'symmetric':
+    unhexlify("6f00dae87c1be1a73b5922ef431cd8f57879569c222d22b1cd71e8546ab8e6f1"),
+}
@@ -1,3 +1,4 @@
+import os
 from . import ed25519_basic
 from .groups import password_to_scalar
 
@@ -14,8 +15,34 @@ class _Ed25519Group:
         return ed25519_basic.arbitrary_element(seed)
     def bytes_to_element(self, b):
         return ed25519_basic.bytes_to_element(b)
+    def bytes_to_elements_verified(self, bs, entropy_f=os.urandom,
+                                   return_exceptions=False):
+        return ed25519_basic.bytes_to_elements_verified(bs, entropy_f,
+                                                        return_exceptions)
+    def elements_to_bytes(self, elements):
+        return ed25519_basic.elements_to_bytes(elements)
+    def multi_scalarmult(self, pairs):
+        return ed25519_basic.multi_scalarmult(pairs)
+    def fixed_base_element(self, e, max_table_bytes):
+        w = ed25519_basic.fixed_base_window(max_table_bytes)
+        if w is None:
+            return e
+        return ed25519_basic.FixedBaseElement(e.XYTZ, w)
+    _validated = False
+    def validate(self):
+        # the constants in ed25519_basic are fixed, so this is a sanity
+        # check that Base has order L, and that the precomputed arbitrary
+        # elements (used for M, N, and S) match their seeds
+        if not self._validated:
+            if not ed25519_basic.is_in_main_subgroup(self.Base.XYTZ):
+                raise ValueError("Base is not in the order-L subgroup")
+            ed25519_basic.check_known_arbitrary_elements()
+            self._validated = True
+        return self
     def order(self):
         return ed25519_basic.L
+    def __reduce__(self):
+        return "Ed25519Group" # a singleton
 
 Ed25519Group = _Ed25519Group()
 Ed25519Group.Base = ed25519_basic.Base
@@ -0,0 +1,406 @@
+"""Run many SPAKE2 handshakes on all of a host's cores.
+
+This library is pure Python, so one process can only do one scalar
+multiplication at a time. A HandshakeEngine hands start() and finish() to a
+pool of worker processes instead:
+
+    from spake2.engine import HandshakeEngine
+    with HandshakeEngine(params, workers=8, max_pending=1024) as engine:
+        f = engine.submit_start(password, side="A", idA=b"alice", idB=b"bob")
+        (outbound_message, state) = f.result()
+        ...
+        key = engine.submit_finish(state, inbound_message).result()
+
+submit_start() and submit_finish() return concurrent.futures.Future objects,
+which can be cancelled until a worker picks them up. At most max_pending jobs
+may be outstanding at once: beyond that, submitting blocks (or raises
+queue.Full, like Queue.put()) until earlier jobs finish. stream() runs an
+iterable of jobs with the same limit, and yields results as they complete.
+
+Each worker builds the fixed-base tables for its params before it takes any
+jobs. If the same passwords are used for many sessions (like a pairing code
+shared by a fleet of devices), set password_cache_size= to have each worker
+keep that many of them as PreparedPasswords. That makes every session with
+a cached password cheaper, but a password that is only used once costs a
+bit more than it would without the cache. The state that start()
+returns is the instance's serialize() output, which holds the password:
+treat it as a secret. finish() may run in a different worker than start()
+did, which has to rebuild the instance from it.
+
+A SessionRouter avoids that: it sends every job for a given session id to
+the same worker process, which keeps the live SPAKE2 instance between
+start() and finish(). Only the password (at start), the messages, and the
+key cross the process boundary.
+
+    with SessionRouter(params, shards=8) as router:
+        outbound_message = router.start(session_id, password,
+                                        side="A").result()
+        ...
+        key = router.finish(session_id, inbound_message).result()
+"""
+
+import os, json, queue, threading, itertools
+import multiprocessing
+from multiprocessing import connection
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+from hashlib import sha256
+from .spake2 import (SPAKE2_A, SPAKE2_B, SPAKE2_Symmetric, DefaultParams,
+                     PreparedPasswordCache, SPAKEError)
+
+_SIDES = {"A": SPAKE2_A, "B": SPAKE2_B, "S": SPAKE2_Symmetric}
+
+StartJob = namedtuple("StartJob", ["password", "side", "idA", "idB",
+                                   "idSymmetric"],
+                      defaults=["A", b"", b"", b""])
+FinishJob = namedtuple("FinishJob", ["state", "inbound_message"])
+
+# each worker process has its own copy of these, set by _init_worker()
+_params = None
+_passwords = None
+
+def _init_worker(params, password_cache_size):
+    global _params, _passwords
+    _params = params.warm()
+    if password_cache_size:
+        _passwords = PreparedPasswordCache(password_cache_size)
+
+def _run_job(job):
+    if isinstance(job, StartJob):
+        klass = _SIDES[job.side]
+        password = job.password
+        if _passwords is not None:
+            password = _passwords.get(password, _params)
+        if klass is SPAKE2_Symmetric:
+            s = klass(password, idSymmetric=job.idSymmetric, params=_params)
+        else:
+            s = klass(password, idA=job.idA, idB=job.idB, params=_params)
+        outbound_message = s.start()
+        return (outbound_message, s.serialize())
+    d = json.loads(job.state.decode("ascii"))
+    s = _SIDES[d["side"]]._deserialize_from_dict(d, _params)
+    return s.finish(job.inbound_message)
+
+def _outcome(future):
+    # the job's result, or the exception it raised (or CancelledError)
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+class HandshakeEngine:
+    def __init__(self, params=DefaultParams, workers=None, max_pending=1024,
+                 password_cache_size=0, mp_context=None):
+        self.params = params
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(), mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(params, password_cache_size))
+
+    def submit(self, job, block=True, timeout=None):
+        """Queue a StartJob or FinishJob, and return a Future for its result.
+        If max_pending jobs are already outstanding, wait for one of them to
+        finish, or raise queue.Full if block=False or the timeout expires."""
+        assert isinstance(job, (StartJob, FinishJob)), job
+        if not self._slots.acquire(block, timeout):
+            raise queue.Full
+        try:
+            f = self._executor.submit(_run_job, job)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.add(f)
+        f.add_done_callback(self._done)
+        return f
+
+    def _done(self, f):
+        with self._lock:
+            self._pending.discard(f)
+        self._slots.release()
+
+    def submit_start(self, password, side="A", idA=b"", idB=b"",
+                     idSymmetric=b"", block=True, timeout=None):
+        """The Future's result is (outbound_message, state)."""
+        assert side in _SIDES, side
+        return self.submit(StartJob(password, side, idA, idB, idSymmetric),
+                           block, timeout)
+
+    def submit_finish(self, state, inbound_message, block=True, timeout=None):
+        """The Future's result is the shared key."""
+        return self.submit(FinishJob(state, bytes(inbound_message)),
+                           block, timeout)
+
+    def stream(self, tagged_jobs):
+        """Run each (tag, job) pair from an iterable, and yield a (tag,
+        result) pair as each one completes, in whatever order they finish.
+        The result is the exception (including CancelledError) if the job
+        failed, so one bad job doesn't stop the others.
+
+        Jobs are pulled from the iterable only as fast as the engine can
+        take them. If the caller stops iterating early, the jobs that the
+        workers haven't started yet are cancelled."""
+        completed = queue.SimpleQueue()
+        tags = {}
+        try:
+            for (tag, job) in tagged_jobs:
+                while True:
+                    try:
+                        f = self.submit(job, block=False)
+                        break
+                    except queue.Full:
+                        if not tags:
+                            # someone else's jobs are in the way
+                            f = self.submit(job)
+                            break
+                        f = completed.get()
+                        yield (tags.pop(f), _outcome(f))
+                tags[f] = tag
+                f.add_done_callback(completed.put)
+                # yield whatever finished while we were submitting
+                while True:
+                    try:
+                        f = completed.get_nowait()
+                    except queue.Empty:
+                        break
+                    yield (tags.pop(f), _outcome(f))
+            while tags:
+                f = completed.get()
+                yield (tags.pop(f), _outcome(f))
+        finally:
+            for f in tags:
+                f.cancel()
+
+    def cancel_pending(self):
+        """Cancel every job that no worker has started yet. Returns the
+        number of jobs that were cancelled."""
+        with self._lock:
+            pending = list(self._pending)
+        return sum(1 for f in pending if f.cancel())
+
+    def close(self, cancel_pending=False):
+        """Wait for outstanding jobs (or cancel the ones that haven't
+        started, if cancel_pending=True), then stop the workers."""
+        if cancel_pending:
+            self.cancel_pending()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close(cancel_pending=exc_type is not None)
+
+
+class UnknownSession(SPAKEError):
+    """finish() was given a session id that its worker doesn't have: it was
+    never started, was already finished or discarded, or was evicted."""
+
+def _new_instance(params, password, side, idA, idB, idSymmetric):
+    klass = _SIDES[side]
+    if klass is SPAKE2_Symmetric:
+        return klass(password, idSymmetric=idSymmetric, params=params)
+    return klass(password, idA=idA, idB=idB, params=params)
+
+def _shard_main(params, max_sessions, requests, results):
+    # the body of each SessionRouter worker process
+    params.warm()
+    sessions = OrderedDict()
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        (job_id, op, session_id, args) = request
+        try:
+            if op == "start":
+                if session_id in sessions:
+                    raise ValueError("session %r is already started"
+                                     % (session_id,))
+                s = _new_instance(params, *args)
+                result = s.start()
+                sessions[session_id] = s
+                while len(sessions) > max_sessions:
+                    sessions.popitem(last=False) # the oldest
+            elif op == "finish":
+                s = sessions.pop(session_id, None)
+                if s is None:
+                    raise UnknownSession(session_id)
+                result = s.finish(args)
+            else:
+                assert op == "discard", op
+                result = sessions.pop(session_id, None) is not None
+        except Exception as e:
+            results.send((job_id, False, e))
+        else:
+            results.send((job_id, True, result))
+
+class SessionRouter:
+    """Run each session's start() and finish() in the same worker process,
+    chosen by a hash of its session id (bytes), which holds the SPAKE2
+    instance in between.
+
+    Each worker holds at most max_sessions sessions. Starting another one
+    evicts its oldest unfinished session, whose finish() will then raise
+    UnknownSession. Call discard() to drop a session that will never be
+    finished. As with HandshakeEngine, at most max_pending jobs may be
+    outstanding, and submitting more blocks or raises queue.Full. Jobs are
+    sent to their worker right away, so their futures can't be cancelled:
+    discard() the session instead.
+    """
+
+    def __init__(self, params=DefaultParams, shards=None, max_pending=1024,
+                 max_sessions=100000, mp_context=None):
+        self.params = params
+        self.shards = shards or os.cpu_count()
+        self.max_pending = max_pending
+        ctx = mp_context or multiprocessing.get_context()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._closed = False
+        self._dead = set() # shards whose worker has exited
+        self._requests = []
+        self._results = []
+        self._workers = []
+        for i in range(self.shards):
+            # Each worker gets its own results pipe. A shared queue would
+            # have a lock that a worker killed mid-write never releases.
+            requests = ctx.Queue()
+            (results, results_w) = ctx.Pipe(duplex=False)
+            p = ctx.Process(target=_shard_main, name="spake2-shard-%d" % i,
+                            args=(params, max_sessions, requests, results_w),
+                            daemon=True)
+            p.start()
+            results_w.close() # so we see EOF if the worker dies
+            self._requests.append(requests)
+            self._results.append(results)
+            self._workers.append(p)
+        self._reader = threading.Thread(target=self._read_results,
+                                        name="spake2-router-results",
+                                        daemon=True)
+        self._reader.start()
+
+    def shard_for(self, session_id):
+        """The index of the worker that handles this session id. This only
+        depends upon the id and the number of shards, so another router
+        process with the same number of shards agrees."""
+        assert isinstance(session_id, bytes), repr(session_id)
+        digest = sha256(session_id).digest()
+        return int.from_bytes(digest[:8], "big") % self.shards
+
+    def _submit(self, op, session_id, args, block, timeout):
+        shard = self.shard_for(session_id)
+        if self._closed:
+            raise RuntimeError("SessionRouter is closed")
+        if not self._slots.acquire(block, timeout):
+            raise queue.Full
+        f = Future()
+        f.set_running_or_notify_cancel()
+        job_id = next(self._job_ids)
+        with self._lock:
+            dead = shard in self._dead
+            if not dead:
+                self._futures[job_id] = (f, shard)
+        if dead:
+            self._slots.release()
+            f.set_exception(RuntimeError("SessionRouter worker died"))
+            return f
+        self._requests[shard].put((job_id, op, session_id, args))
+        return f
+
+    def start(self, session_id, password, side="A", idA=b"", idB=b"",
+              idSymmetric=b"", block=True, timeout=None):
+        """Create and start() a session in its worker. The Future's result
+        is the outbound message."""
+        assert side in _SIDES, side
+        return self._submit("start", session_id,
+                            (password, side, idA, idB, idSymmetric),
+                            block, timeout)
+
+    def finish(self, session_id, inbound_message, block=True, timeout=None):
+        """finish() the session, and forget it. The Future's result is the
+        shared key."""
+        return self._submit("finish", session_id, bytes(inbound_message),
+                            block, timeout)
+
+    def discard(self, session_id, block=True, timeout=None):
+        """Forget an unfinished session. The Future's result is True if the
+        worker still had it."""
+        return self._submit("discard", session_id, None, block, timeout)
+
+    def _read_results(self):
+        # Wait on every worker's results pipe and its process sentinel at
+        # once, so a worker that dies is noticed right away, however busy
+        # the others are. This returns once every worker has exited.
+        shard_of = {}
+        for (shard, (conn, p)) in enumerate(zip(self._results,
+                                                self._workers)):
+            shard_of[conn] = shard_of[p.sentinel] = shard
+        while shard_of:
+            for ready in connection.wait(list(shard_of)):
+                shard = shard_of[ready]
+                if ready is self._results[shard]:
+                    try:
+                        self._resolve(ready.recv())
+                    except EOFError:
+                        del shard_of[ready]
+                    continue
+                # the worker has exited: collect anything it sent first,
+                # then fail whatever it never answered
+                del shard_of[ready]
+                conn = self._results[shard]
+                try:
+                    while conn.poll():
+                        self._resolve(conn.recv())
+                except EOFError:
+                    pass
+                shard_of.pop(conn, None)
+                with self._lock:
+                    self._dead.add(shard)
+                self._fail_jobs(lambda s: s == shard,
+                                "SessionRouter worker died")
+
+    def _resolve(self, item):
+        (job_id, ok, value) = item
+        with self._lock:
+            (f, _) = self._futures.pop(job_id)
+        self._slots.release()
+        if ok:
+            f.set_result(value)
+        else:
+            f.set_exception(value)
+
+    def _fail_jobs(self, is_lost, reason):
+        with self._lock:
+            lost = [(job_id, f) for (job_id, (f, shard))
+                    in self._futures.items() if is_lost(shard)]
+            for (job_id, _) in lost:
+                del self._futures[job_id]
+        for (_, f) in lost:
+            self._slots.release()
+            f.set_exception(RuntimeError(reason))
+
+    def close(self):
+        """Wait for outstanding jobs, then stop the workers. Any unfinished
+        sessions are lost, and jobs for a worker that died are failed."""
+        if self._closed:
+            return
+        self._closed = True
+        for requests in self._requests:
+            requests.put(None)
+        for p in self._workers:
+            p.join()
+        self._reader.join()
+        # the reader has failed every job of a worker that died, and the
+        # others answered everything before they exited, so this is only a
+        # backstop
+        self._fail_jobs(lambda shard: True, "SessionRouter was closed")
+
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -1,6 +1,4 @@
-import hashlib
-from cryptography.hazmat.primitives.kdf import hkdf
-from cryptography.hazmat.primitives import hashes
+import os, hmac, hashlib, threading
 from .util import (size_bits, size_bytes, unbiased_randrange,
                    bytes_to_number, number_to_bytes)
 
@@ -51,23 +49,50 @@ use os.urandom is for deterministic unit tests.
     s = g.password_to_scalar(password)
 
     e = g.bytes_to_element(bytes)
+    [e1, e2] = g.bytes_to_elements_verified([bytes1, bytes2])
+    [e1, err] = g.bytes_to_elements_verified([bytes1, bad],
+                                             return_exceptions=True)
     e = g.arbitrary_element(seed)
     e = g.Base # this is an Element too, with all the methods below
 
     e3 = e1.add(e2)
+    e3 = e1.subtract(e2)
+    e3 = e1.negate() # same as e1.scalarmult(-1), but cheaper
     e3 = e1.scalarmult(s) # takes int, positive or negative
+    e3 = g.multi_scalarmult([(s1, e1), (s2, e2)]) # s1*e1 + s2*e2
     bytes = e.to_bytes()
+    [bytes1, bytes2] = g.elements_to_bytes([e1, e2]) # faster for big lists
     # equality tests work: e1 == e2, e1 != e2
+
+    # an equivalent element that will be multiplied many times, and is
+    # allowed to spend up to max_table_bytes on a precomputed table
+    e = g.fixed_base_element(e, max_table_bytes)
+
+    # optional sanity checks of the group parameters, which raise
+    # ValueError if something is wrong
+    g = g.validate()
 """
 
 
+# HKDF-SHA256 (RFC 5869) from the standard library. We always use an empty
+# salt, which HMAC pads to the same key as the RFC's default (HashLen zero
+# bytes), so every extract step can start from a copy of this pre-keyed HMAC
+# instead of setting up a new one.
+_hkdf_extract = hmac.new(b"", digestmod=hashlib.sha256)
+
+def _hkdf(data, num_bytes, info):
+    h = _hkdf_extract.copy()
+    h.update(data)
+    prk = h.digest()
+    blocks = []
+    t = b""
+    for counter in range(1, (num_bytes + 31) // 32 + 1):
+        t = hmac.digest(prk, t + info + bytes([counter]), "sha256")
+        blocks.append(t)
+    return b"".join(blocks)[:num_bytes]
+
 def expand_password(data, num_bytes):
-    return hkdf.HKDF(
-        algorithm=hashes.SHA256(),
-        length=num_bytes,
-        salt=b"",
-        info=b"SPAKE2 pw"
-    ).derive(data)
+    return _hkdf(data, num_bytes, b"SPAKE2 pw")
 
 def password_to_scalar(pw, scalar_size_bytes, q):
     assert isinstance(pw, bytes)
@@ -79,47 +104,180 @@ def password_to_scalar(pw, scalar_size_bytes, q):
     return i % q
 
 def expand_arbitrary_element_seed(data, num_bytes):
-    return hkdf.HKDF(
-        algorithm=hashes.SHA256(),
-        length=num_bytes,
-        salt=b"",
-        info=b"SPAKE2 arbitrary element"
-    ).derive(data)
+    return _hkdf(data, num_bytes, b"SPAKE2 arbitrary element")
+
+def _sliding_window_digits(s, w):
+    # least-significant digit first
+    digits = []
+    while s:
+        if s & 1:
+            d = s & ((1 << w) - 1)
+            s -= d
+        else:
+            d = 0
+        digits.append(d)
+        s >>= 1
+    return digits
+
+# Checking that n inbound elements are all in the prime-order subgroup costs
+# n full-size scalarmults. For big batches, it is cheaper to check random
+# subsets instead: the sum of a random subset of the elements is in the
+# subgroup for every subset iff each element is. If one of them is not,
+# then adding it or leaving it out changes the sum's membership, so each
+# subset catches it with probability at least 1/2, whatever its order. We
+# can't use random scalar coefficients instead of subsets (the usual
+# small-exponent test), because both kinds of group have small-order
+# elements (the Ed25519 cofactor is 8, and (p-1)/q is even) that an even
+# coefficient would hide. After BATCH_MEMBERSHIP_ROUNDS subsets, a batch
+# with a bad element gets through with probability 2^-rounds. Each round
+# costs one scalarmult plus n/2 additions, so we only batch when that's
+# cheaper than checking the elements one at a time.
+
+BATCH_MEMBERSHIP_ROUNDS = 64
+
+def check_members(items, is_member, add, zero, entropy_f=os.urandom):
+    """Return [is_member(x) for x in items], sharing the work for big
+    batches. add(x,y) is the group operation, and zero its identity."""
+    n = len(items)
+    if n <= 2*BATCH_MEMBERSHIP_ROUNDS:
+        return [is_member(x) for x in items]
+    for _ in range(BATCH_MEMBERSHIP_ROUNDS):
+        subset = entropy_f((n+7)//8)
+        acc = zero
+        for i, x in enumerate(items):
+            if (subset[i >> 3] >> (i & 7)) & 1:
+                acc = add(acc, x)
+        if not is_member(acc):
+            break
+    else:
+        return [True] * n
+    # someone is bad: split the batch in two to find out who
+    half = n // 2
+    return (check_members(items[:half], is_member, add, zero, entropy_f) +
+            check_members(items[half:], is_member, add, zero, entropy_f))
+
+# the widest fixed-base window either group will use
+MAX_FIXED_BASE_WINDOW = 8
+# the generator is used by every start(), so it gets its own table
+BASE_TABLE_BYTES = 512*1024
+MULTI_EXP_WINDOW = 4
 
 class _Element:
-    def __init__(self, group, e):
+    def __init__(self, group, e, encoding=None):
         self._group = group
         self._e = e
+        self._bytes = encoding # remembered by to_bytes()/bytes_to_element()
 
     def add(self, other):
         return self._group._add(self, other)
     def scalarmult(self, s):
         return self._group._scalarmult(self, s)
+    def negate(self):
+        return self._group._negate(self)
+    def subtract(self, other):
+        return self.add(other.negate())
 
     def to_bytes(self):
-        return self._group._element_to_bytes(self)
+        if self._bytes is None:
+            self._bytes = self._group._element_to_bytes(self)
+        return self._bytes
+
+    def __eq__(self, other):
+        if not isinstance(other, _Element):
+            return NotImplemented
+        return self._group is other._group and self._e == other._e
+    def __ne__(self, other):
+        return not self == other
+    def __hash__(self):
+        # defining __eq__ would otherwise make elements unhashable
+        return hash((id(self._group), self._e))
+
+class LazyFixedBaseTable:
+    # Mixed into the fixed-base elements of both groups (Base, and the
+    # M/N/S blinding factors). Building a table costs about as much as two
+    # ordinary scalarmults, so the first use goes without, and the second
+    # one builds the table for all later uses. A process that only ever runs
+    # one handshake never pays for it. Subclasses set self._w and provide
+    # _compute_table().
+    _table = None
+    _used = False
+
+    def _get_table(self):
+        # None on the first use, the table ever after
+        if self._table is None:
+            if not self._used:
+                self._used = True
+                return None
+            self._table = self._compute_table()
+        return self._table
+
+    def build_table(self):
+        # for long-running processes that know they'll need it
+        self._used = True
+        self._get_table()
+
+class _FixedBaseElement(LazyFixedBaseTable, _Element):
+    # An element that we expect to raise to many different powers. The
+    # table holds e^(d*2^(w*i)) for every w-bit window i and every digit
+    # 1<=d<2^w, which turns exponentiation into one modular multiplication
+    # per window.
+    def __init__(self, group, e, w):
+        _Element.__init__(self, group, e)
+        self._w = w
+
+    def _compute_table(self):
+        return self._group._fixed_base_table(self._e, self._w)
+
+    def scalarmult(self, s):
+        g = self._group
+        if not isinstance(s, int):
+            raise TypeError("E*N requires N be a scalar")
+        table = self._get_table()
+        if table is None:
+            return g._scalarmult(self, s)
+        return _Element(g, g._scalarmult_fixed_base(table, self._w, s % g.q))
 
 class IntegerGroup:
+    _name = None # set for the built-in groups
+
     def __init__(self, p, q, g):
         self.q = q # the subgroup order, used for scalars
         self.scalar_size_bytes = size_bytes(self.q)
-        _s = self.scalar_to_bytes(self.password_to_scalar(b""))
-        assert isinstance(_s, bytes)
-        assert len(_s) >= self.scalar_size_bytes
         self.Zero = _Element(self, 1)
-        self.Base = _Element(self, g) # generator of the subgroup
 
         # these are the public system parameters
         self.p = p # the field size
         self.element_size_bits = size_bits(self.p)
         self.element_size_bytes = size_bytes(self.p)
 
-        # double-check that the generator has the right order
-        assert pow(g, self.q, self.p) == 1
+        # generator of the subgroup
+        self.Base = self.fixed_base_element(_Element(self, g),
+                                            BASE_TABLE_BYTES)
+        self._validated = False
+
+    def validate(self):
+        # Sanity-check the parameters. The built-in groups are known to be
+        # good, so this costs nothing at import time unless you ask for it.
+        if not self._validated:
+            _s = self.scalar_to_bytes(self.password_to_scalar(b""))
+            assert isinstance(_s, bytes)
+            assert len(_s) >= self.scalar_size_bytes
+            # double-check that the generator has the right order
+            if not self._is_member(self.Base):
+                raise ValueError("generator is not in the order-q subgroup")
+            self._validated = True
+        return self
 
     def order(self):
         return self.q
 
+    def __reduce__(self):
+        # the built-in groups pickle by name, so a worker process that
+        # unpickles one shares the module's instance (and its tables)
+        if self._name is not None:
+            return self._name
+        return (IntegerGroup, (self.p, self.q, self.Base._e))
+
     def random_scalar(self, entropy_f):
         return unbiased_randrange(0, self.q, entropy_f)
 
@@ -131,8 +289,7 @@ class IntegerGroup:
         return number_to_bytes(i, self.q)
 
     def bytes_to_scalar(self, b):
-        # for restore of intermediate state
-        assert isinstance(b, bytes)
+        # for restore of intermediate state. b can be any bytes-like object.
         assert len(b) == self.scalar_size_bytes
         i = bytes_to_number(b)
         assert 0 <= i < self.q, (0, i, self.q)
@@ -160,9 +317,8 @@ class IntegerGroup:
         r = (self.p - 1) // self.q
         assert r * self.q == self.p - 1
         h = bytes_to_number(processed_seed) % self.p
-        element = _Element(self, pow(h, r, self.p))
-        assert self._is_member(element)
-        return element
+        # (h^r)^q = h^(p-1) = 1, so this is always a member
+        return _Element(self, pow(h, r, self.p))
 
     def _is_member(self, e):
         if not e._group is self:
@@ -177,18 +333,56 @@ class IntegerGroup:
         assert e._group is self
         return number_to_bytes(e._e, self.p)
 
+    def elements_to_bytes(self, elements):
+        # integer elements are already normalized, so there is nothing to
+        # share between them
+        return [e.to_bytes() for e in elements]
+
     def bytes_to_element(self, b):
-        # for receiving from other side: test group membership here
-        assert isinstance(b, bytes)
+        # for receiving from other side: test group membership here. b can
+        # be any bytes-like object, such as a memoryview of a receive buffer
         assert len(b) == self.element_size_bytes
         i = bytes_to_number(b)
         if i <= 0 or i >= self.p:   # Zp* excludes 0
             raise ValueError("alleged element not in the field")
-        e = _Element(self, i)
+        e = _Element(self, i, bytes(b))
         if not self._is_member(e):
             raise ValueError("element is not in the right group")
         return e
 
+    def bytes_to_elements_verified(self, bs, entropy_f=os.urandom,
+                                   return_exceptions=False):
+        # [bytes_to_element(b) for b in bs], with the membership checks
+        # done as a batch. With return_exceptions=True, each bad encoding
+        # gets a ValueError in place of its element, and nothing is raised.
+        results = []
+        for b in bs:
+            i = bytes_to_number(b)
+            if len(b) != self.element_size_bytes:
+                err = ValueError("element has the wrong length")
+            elif not 0 < i < self.p:   # Zp* excludes 0
+                err = ValueError("alleged element not in the field")
+            else:
+                results.append(i)
+                continue
+            if not return_exceptions:
+                raise err
+            results.append(err)
+        todo = [n for (n, i) in enumerate(results)
+                if not isinstance(i, Exception)]
+        p, q = self.p, self.q
+        ok = check_members([results[n] for n in todo],
+                           lambda i: pow(i, q, p) == 1,
+                           lambda i, j: (i * j) % p, 1, entropy_f)
+        for (n, good) in zip(todo, ok):
+            if good:
+                results[n] = _Element(self, results[n], bytes(bs[n]))
+            elif return_exceptions:
+                results[n] = ValueError("element is not in the right group")
+            else:
+                raise ValueError("element %d is not in the right group" % n)
+        return results
+
     def _scalarmult(self, e1, i):
         if not isinstance(e1, _Element):
             raise TypeError("E*N requires E be an element")
@@ -197,6 +391,103 @@ class IntegerGroup:
             raise TypeError("E*N requires N be a scalar")
         return _Element(self, pow(e1._e, i % self.q, self.p))
 
+    def fixed_base_element(self, e, max_table_bytes):
+        assert e._group is self
+        # each entry is one element-sized int, plus CPython's overhead
+        entry_bytes = self.element_size_bytes + 32
+        best = None
+        for w in range(2, MAX_FIXED_BASE_WINDOW+1):
+            windows = (size_bits(self.q) + w - 1) // w
+            if windows * ((1 << w) - 1) * entry_bytes <= max_table_bytes:
+                best = w
+        if best is None:
+            return e
+        return _FixedBaseElement(self, e._e, best)
+
+    def _fixed_base_table(self, e, w):
+        table = []
+        row_base = e
+        for _ in range((size_bits(self.q) + w - 1) // w):
+            row = [row_base]
+            for _ in range((1 << w) - 2):
+                row.append((row[-1] * row_base) % self.p)
+            table.append(row)
+            # the last entry is row_base^(2^w-1), so one more multiplication
+            # gets us to row_base^(2^w), the base for the next window
+            row_base = (row[-1] * row_base) % self.p
+        return table
+
+    def _scalarmult_fixed_base(self, table, w, i):
+        mask = (1 << w) - 1
+        result = 1
+        for row in table:
+            d = i & mask
+            i >>= w
+            if d:
+                result = (result * row[d-1]) % self.p
+        assert i == 0
+        return result
+
+    def multi_scalarmult(self, pairs):
+        # the product of e^s for each (s,e) in pairs. Elements with a
+        # fixed-base table use it, and the rest share a single squaring
+        # chain (Straus' trick).
+        result = 1
+        terms = []
+        for (s, e) in pairs:
+            if not isinstance(e, _Element):
+                raise TypeError("E*N requires E be an element")
+            assert e._group is self
+            if not isinstance(s, int):
+                raise TypeError("E*N requires N be a scalar")
+            s = s % self.q
+            if s == 0:
+                continue
+            table = None
+            if isinstance(e, _FixedBaseElement):
+                table = e._get_table()
+            if table is not None:
+                result = (result * self._scalarmult_fixed_base(table, e._w, s)
+                          ) % self.p
+            else:
+                terms.append((s, e._e))
+        if len(terms) == 1:
+            # nothing to share, and the builtin pow() is a little faster
+            (s, e) = terms[0]
+            result = (result * pow(e, s, self.p)) % self.p
+        elif terms:
+            result = (result * self._multi_exp(terms, MULTI_EXP_WINDOW)
+                      ) % self.p
+        return _Element(self, result)
+
+    def _multi_exp(self, terms, w):
+        # the product of e^s for each (s,e) in terms, using interleaved
+        # sliding windows: each exponent is rewritten with odd digits
+        # below 2^w, each followed by at least w-1 zeros, so every term
+        # needs only its odd powers, and one multiplication per w+1 bits
+        # or so. All the terms share a single squaring chain.
+        columns = []
+        for (s, e) in terms:
+            e2 = (e * e) % self.p
+            odd_powers = [e] # e^1, e^3, .. e^(2^w-1)
+            for _ in range((1 << (w-1)) - 1):
+                odd_powers.append((odd_powers[-1] * e2) % self.p)
+            columns.append((_sliding_window_digits(s, w), odd_powers))
+        acc = 1
+        for i in reversed(range(max(len(digits) for (digits, _) in columns))):
+            if acc != 1:
+                acc = (acc * acc) % self.p
+            for (digits, odd_powers) in columns:
+                if i < len(digits) and digits[i]:
+                    acc = (acc * odd_powers[digits[i] >> 1]) % self.p
+        return acc
+
+    def _negate(self, e):
+        # the group operation is multiplication, so this is the modular
+        # inverse: much cheaper than scalarmult(-1)
+        assert e._group is self
+        return _Element(self, pow(e._e, -1, self.p))
+
     def _add(self, e1, e2):
         if not isinstance(e1, _Element):
             raise TypeError("E*N requires E be an element")
@@ -212,23 +503,40 @@ class IntegerGroup:
 # recommended these 2048 and 3072 bit groups from this NIST document:
 # http://csrc.nist.gov/groups/ST/toolkit/documents/Examples/DSA2_All.pdf
 
-# L=1024, N=160
-I1024 = IntegerGroup(
-    p=0xE0A67598CD1B763BC98C8ABB333E5DDA0CD3AA0E5E1FB5BA8A7B4EABC10BA338FAE06DD4B90FDA70D7CF0CB0C638BE3341BEC0AF8A7330A3307DED2299A0EE606DF035177A239C34A912C202AA5F83B9C4A7CF0235B5316BFC6EFB9A248411258B30B839AF172440F32563056CB67A861158DDD90E6A894C72A5BBEF9E286C6B,
-    q=0xE950511EAB424B9A19A2AEB4E159B7844C589C4F,
-    g=0xD29D5121B0423C2769AB21843E5A3240FF19CACC792264E3BB6BE4F78EDD1B15C4DFF7F1D905431F0AB16790E1F773B5CE01C804E509066A9919F5195F4ABC58189FD9FF987389CB5BEDF21B4DAB4F8B76A055FFE2770988FE2EC2DE11AD92219F0B351869AC24DA3D7BA87011A701CE8EE7BFE49486ED4527B7186CA4610A75,
-    )
-
-# L=2048, N=224
-I2048 = IntegerGroup(
-    p=0xC196BA05AC29E1F9C3C72D56DFFC6154A033F1477AC88EC37F09BE6C5BB95F51C296DD20D1A28A067CCC4D4316A4BD1DCA55ED1066D438C35AEBAABF57E7DAE428782A95ECA1C143DB701FD48533A3C18F0FE23557EA7AE619ECACC7E0B51652A8776D02A425567DED36EABD90CA33A1E8D988F0BBB92D02D1D20290113BB562CE1FC856EEB7CDD92D33EEA6F410859B179E7E789A8F75F645FAE2E136D252BFFAFF89528945C1ABE705A38DBC2D364AADE99BE0D0AAD82E5320121496DC65B3930E38047294FF877831A16D5228418DE8AB275D7D75651CEFED65F78AFC3EA7FE4D79B35F62A0402A1117599ADAC7B269A59F353CF450E6982D3B1702D9CA83,
-    q=0x90EAF4D1AF0708B1B612FF35E0A2997EB9E9D263C9CE659528945C0D,
-    g=0xA59A749A11242C58C894E9E5A91804E8FA0AC64B56288F8D47D51B1EDC4D65444FECA0111D78F35FC9FDD4CB1F1B79A3BA9CBEE83A3F811012503C8117F98E5048B089E387AF6949BF8784EBD9EF45876F2E6A5A495BE64B6E770409494B7FEE1DBB1E4B2BC2A53D4F893D418B7159592E4FFFDF6969E91D770DAEBD0B5CB14C00AD68EC7DC1E5745EA55C706C4A1C5C88964E34D09DEB753AD418C1AD0F4FDFD049A955E5D78491C0B7A2F1575A008CCD727AB376DB6E695515B05BD412F5B8C2F4C77EE10DA48ABD53F5DD498927EE7B692BBBCDA2FB23A516C5B4533D73980B2A3B60E384ED200AE21B40D273651AD6060C13D97FD69AA13C5611A51B9085,
-    )
-
-# L=3072, N=256
-I3072 = IntegerGroup(
-    p=0x90066455B5CFC38F9CAA4A48B4281F292C260FEEF01FD61037E56258A7795A1C7AD46076982CE6BB956936C6AB4DCFE05E6784586940CA544B9B2140E1EB523F009D20A7E7880E4E5BFA690F1B9004A27811CD9904AF70420EEFD6EA11EF7DA129F58835FF56B89FAA637BC9AC2EFAAB903402229F491D8D3485261CD068699B6BA58A1DDBBEF6DB51E8FE34E8A78E542D7BA351C21EA8D8F1D29F5D5D15939487E27F4416B0CA632C59EFD1B1EB66511A5A0FBF615B766C5862D0BD8A3FE7A0E0DA0FB2FE1FCB19E8F9996A8EA0FCCDE538175238FC8B0EE6F29AF7F642773EBE8CD5402415A01451A840476B2FCEB0E388D30D4B376C37FE401C2A2C2F941DAD179C540C1C8CE030D460C4D983BE9AB0B20F69144C1AE13F9383EA1C08504FB0BF321503EFE43488310DD8DC77EC5B8349B8BFE97C2C560EA878DE87C11E3D597F1FEA742D73EEC7F37BE43949EF1A0D15C3F3E3FC0A8335617055AC91328EC22B50FC15B941D3D1624CD88BC25F3E941FDDC6200689581BFEC416B4B2CB73,
-    q=0xCFA0478A54717B08CE64805B76E5B14249A77A4838469DF7F7DC987EFCCFB11D,
-    g=0x5E5CBA992E0A680D885EB903AEA78E4A45A469103D448EDE3B7ACCC54D521E37F84A4BDD5B06B0970CC2D2BBB715F7B82846F9A0C393914C792E6A923E2117AB805276A975AADB5261D91673EA9AAFFEECBFA6183DFCB5D3B7332AA19275AFA1F8EC0B60FB6F66CC23AE4870791D5982AAD1AA9485FD8F4A60126FEB2CF05DB8A7F0F09B3397F3937F2E90B9E5B9C9B6EFEF642BC48351C46FB171B9BFA9EF17A961CE96C7E7A7CC3D3D03DFAD1078BA21DA425198F07D2481622BCE45969D9C4D6063D72AB7A0F08B2F49A7CC6AF335E08C4720E31476B67299E231F8BD90B39AC3AE3BE0C6B6CACEF8289A2E2873D58E51E029CAFBD55E6841489AB66B5B4B9BA6E2F784660896AFF387D92844CCB8B69475496DE19DA2E58259B090489AC8E62363CDF82CFD8EF2A427ABCD65750B506F56DDE3B988567A88126B914D7828E2B63A6D7ED0747EC59E0E0A23CE7D8A74C1D2C2A7AFB6A29799620F00E11C33787F7DED3B30E1A22D09F1FBDA1ABBBFBF25CAE05A13F812E34563F99410E73B,
-    )
+_integer_groups_lock = threading.Lock()
+_INTEGER_GROUPS = {
+    # L=1024, N=160
+    "I1024": dict(
+        p=0xE0A67598CD1B763BC98C8ABB333E5DDA0CD3AA0E5E1FB5BA8A7B4EABC10BA338FAE06DD4B90FDA70D7CF0CB0C638BE3341BEC0AF8A7330A3307DED2299A0EE606DF035177A239C34A912C202AA5F83B9C4A7CF0235B5316BFC6EFB9A248411258B30B839AF172440F32563056CB67A861158DDD90E6A894C72A5BBEF9E286C6B,
+        q=0xE950511EAB424B9A19A2AEB4E159B7844C589C4F,
+        g=0xD29D5121B0423C2769AB21843E5A3240FF19CACC792264E3BB6BE4F78EDD1B15C4DFF7F1D905431F0AB16790E1F773B5CE01C804E509066A9919F5195F4ABC58189FD9FF987389CB5BEDF21B4DAB4F8B76A055FFE2770988FE2EC2DE11AD92219F0B351869AC24DA3D7BA87011A701CE8EE7BFE49486ED4527B7186CA4610A75,
+        ),
+
+    # L=2048, N=224
+    "I2048": dict(
+        p=0xC196BA05AC29E1F9C3C72D56DFFC6154A033F1477AC88EC37F09BE6C5BB95F51C296DD20D1A28A067CCC4D4316A4BD1DCA55ED1066D438C35AEBAABF57E7DAE428782A95ECA1C143DB701FD48533A3C18F0FE23557EA7AE619ECACC7E0B51652A8776D02A425567DED36EABD90CA33A1E8D988F0BBB92D02D1D20290113BB562CE1FC856EEB7CDD92D33EEA6F410859B179E7E789A8F75F645FAE2E136D252BFFAFF89528945C1ABE705A38DBC2D364AADE99BE0D0AAD82E5320121496DC65B3930E38047294FF877831A16D5228418DE8AB275D7D75651CEFED65F78AFC3EA7FE4D79B35F62A0402A1117599ADAC7B269A59F353CF450E6982D3B1702D9CA83,
+        q=0x90EAF4D1AF0708B1B612FF35E0A2997EB9E9D263C9CE659528945C0D,
+        g=0xA59A749A11242C58C894E9E5A91804E8FA0AC64B56288F8D47D51B1EDC4D65444FECA0111D78F35FC9FDD4CB1F1B79A3BA9CBEE83A3F811012503C8117F98E5048B089E387AF6949BF8784EBD9EF45876F2E6A5A495BE64B6E770409494B7FEE1DBB1E4B2BC2A53D4F893D418B7159592E4FFFDF6969E91D770DAEBD0B5CB14C00AD68EC7DC1E5745EA55C706C4A1C5C88964E34D09DEB753AD418C1AD0F4FDFD049A955E5D78491C0B7A2F1575A008CCD727AB376DB6E695515B05BD412F5B8C2F4C77EE10DA48ABD53F5DD498927EE7B692BBBCDA2FB23A516C5B4533D73980B2A3B60E384ED200AE21B40D273651AD6060C13D97FD69AA13C5611A51B9085,
+        ),
+
+    # L=3072, N=256
+    "I3072": dict(
+        p=0x90066455B5CFC38F9CAA4A48B4281F292C260FEEF01FD61037E56258A7795A1C7AD46076982CE6BB956936C6AB4DCFE05E6784586940CA544B9B2140E1EB523F009D20A7E7880E4E5BFA690F1B9004A27811CD9904AF70420EEFD6EA11EF7DA129F58835FF56B89FAA637BC9AC2EFAAB903402229F491D8D3485261CD068699B6BA58A1DDBBEF6DB51E8FE34E8A78E542D7BA351C21EA8D8F1D29F5D5D15939487E27F4416B0CA632C59EFD1B1EB66511A5A0FBF615B766C5862D0BD8A3FE7A0E0DA0FB2FE1FCB19E8F9996A8EA0FCCDE538175238FC8B0EE6F29AF7F642773EBE8CD5402415A01451A840476B2FCEB0E388D30D4B376C37FE401C2A2C2F941DAD179C540C1C8CE030D460C4D983BE9AB0B20F69144C1AE13F9383EA1C08504FB0BF321503EFE43488310DD8DC77EC5B8349B8BFE97C2C560EA878DE87C11E3D597F1FEA742D73EEC7F37BE43949EF1A0D15C3F3E3FC0A8335617055AC91328EC22B50FC15B941D3D1624CD88BC25F3E941FDDC6200689581BFEC416B4B2CB73,
+        q=0xCFA0478A54717B08CE64805B76E5B14249A77A4838469DF7F7DC987EFCCFB11D,
+        g=0x5E5CBA992E0A680D885EB903AEA78E4A45A469103D448EDE3B7ACCC54D521E37F84A4BDD5B06B0970CC2D2BBB715F7B82846F9A0C393914C792E6A923E2117AB805276A975AADB5261D91673EA9AAFFEECBFA6183DFCB5D3B7332AA19275AFA1F8EC0B60FB6F66CC23AE4870791D5982AAD1AA9485FD8F4A60126FEB2CF05DB8A7F0F09B3397F3937F2E90B9E5B9C9B6EFEF642BC48351C46FB171B9BFA9EF17A961CE96C7E7A7CC3D3D03DFAD1078BA21DA425198F07D2481622BCE45969D9C4D6063D72AB7A0F08B2F49A7CC6AF335E08C4720E31476B67299E231F8BD90B39AC3AE3BE0C6B6CACEF8289A2E2873D58E51E029CAFBD55E6841489AB66B5B4B9BA6E2F784660896AFF387D92844CCB8B69475496DE19DA2E58259B090489AC8E62363CDF82CFD8EF2A427ABCD65750B506F56DDE3B988567A88126B914D7828E2B63A6D7ED0747EC59E0E0A23CE7D8A74C1D2C2A7AFB6A29799620F00E11C33787F7DED3B30E1A22D09F1FBDA1ABBBFBF25CAE05A13F812E34563F99410E73B,
+        ),
+}
+
+def __getattr__(name):
+    # I1024/I2048/I3072 are built the first time someone asks for them, so
+    # importing this module doesn't cost anything for unused groups
+    if name in _INTEGER_GROUPS:
+        with _integer_groups_lock:
+            # another thread might have beaten us to it, and there must
+            # only ever be one of each
+            if name not in globals():
+                group = IntegerGroup(**_INTEGER_GROUPS[name])
+                group._name = name
+                globals()[name] = group
+        return globals()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -8,12 +8,92 @@
 #
 # The safe way to choose these is to hash a public string.
 
+#
+# Each SPAKE2 message multiplies one of these by the password scalar, so we
+# let the group precompute a fixed-base table for each of them (built on
+# first reuse). table_bytes is the memory budget for all three tables
+# together: a smaller budget gives narrower windows, and a budget of 0
+# disables the tables.
+
+from hashlib import sha256
+
+DEFAULT_TABLE_BYTES = 1024*1024
+
 class _Params:
-    def __init__(self, group, M=b"M", N=b"N", S=b"symmetric"):
+    def __init__(self, group, M=b"M", N=b"N", S=b"symmetric",
+                 table_bytes=DEFAULT_TABLE_BYTES):
         self.group = group
-        self.M = group.arbitrary_element(seed=M)
-        self.N = group.arbitrary_element(seed=N)
-        self.S = group.arbitrary_element(seed=S)
+        self.table_bytes = table_bytes
         self.M_str = M
         self.N_str = N
         self.S_str = S
+        # M, N, and S are derived the first time they're used, so that
+        # importing a parameter set is cheap
+        self._M = None
+        self._N = None
+        self._S = None
+        self._validated = False
+        self._fingerprint = None
+
+    def fingerprint(self):
+        """A digest of the group and the M/N/S elements: two params with the
+        same fingerprint can be used interchangeably."""
+        if self._fingerprint is None:
+            g = self.group
+            pieces = [g.Base.to_bytes(), self.M.to_bytes(),
+                      self.N.to_bytes(), self.S.to_bytes()]
+            self._fingerprint = sha256(b"".join(pieces)).digest()
+        return self._fingerprint
+
+    def _blinding_element(self, seed):
+        group = self.group
+        return group.fixed_base_element(group.arbitrary_element(seed=seed),
+                                        self.table_bytes // 3)
+
+    @property
+    def M(self):
+        if self._M is None:
+            self._M = self._blinding_element(self.M_str)
+        return self._M
+
+    @property
+    def N(self):
+        if self._N is None:
+            self._N = self._blinding_element(self.N_str)
+        return self._N
+
+    @property
+    def S(self):
+        if self._S is None:
+            self._S = self._blinding_element(self.S_str)
+        return self._S
+
+    def validate(self):
+        """Check the group, and that M, N, and S are distinct elements of
+        its prime-order subgroup. This is optional, and only does the work
+        once."""
+        if not self._validated:
+            g = self.group.validate()
+            elements = [self.M, self.N, self.S]
+            for e in elements:
+                g.bytes_to_element(e.to_bytes()) # raises if not a member
+            if len(set(e.to_bytes() for e in elements)) != 3:
+                raise ValueError("M, N, and S must be distinct")
+            self._validated = True
+        return self
+
+    def warm(self):
+        """Build the fixed-base tables for Base, M, N, and S now, instead of
+        during the first sessions that use them. This is for long-running
+        servers and worker processes."""
+        for e in [self.group.Base, self.M, self.N, self.S]:
+            build_table = getattr(e, "build_table", None)
+            if build_table is not None: # tables might be disabled
+                build_table()
+        return self
+
+    def __reduce__(self):
+        # M, N, and S are rederived from their seeds (lazily) on the other
+        # side, and the group is pickled by name
+        return (_Params, (self.group, self.M_str, self.N_str, self.S_str,
+                          self.table_bytes))
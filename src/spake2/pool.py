@@ -0,0 +1,89 @@
+import os, threading
+from collections import deque
+from .parameters.ed25519 import ParamsEd25519
+
+class EphemeralPool:
+    """A supply of (x, x*Base) pairs for start() to use, computed ahead of
+    time. That multiplication is the only part of start() that doesn't
+    depend upon the password, and takes about half of its time.
+
+    Pass pool= to SPAKE2_A/SPAKE2_B/SPAKE2_Symmetric. Each pair is handed
+    out exactly once: take() removes it from the pool, and a forked child
+    process throws away whatever it inherited from its parent. When the
+    pool is empty, start() does the work itself.
+
+    With background=True (the default), a daemon thread refills the pool
+    up to 'size' whenever it falls below 'low_watermark'. Because of the
+    GIL this doesn't add any CPU, but it moves the work into the gaps
+    between requests. With background=False, call fill() yourself. A pool
+    uses its own entropy_f, not the one given to the SPAKE2 instance.
+    """
+
+    def __init__(self, params=ParamsEd25519, size=64, low_watermark=None,
+                 entropy_f=os.urandom, background=True):
+        self.params = params
+        self.size = size
+        if low_watermark is None:
+            low_watermark = size // 2
+        self.low_watermark = low_watermark
+        self.entropy_f = entropy_f
+        self._background = background
+        self._closed = False
+        self._start()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._pairs = deque()
+        self._wakeup = threading.Event()
+        self._thread = None
+        if self._background:
+            self._thread = threading.Thread(target=self._run,
+                                            name="spake2-ephemeral-pool",
+                                            daemon=True)
+            self._thread.start()
+            self._wakeup.set()
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def take(self):
+        """Return a new (x, x*Base) pair, or None if the pool is empty."""
+        if os.getpid() != self._pid:
+            # we were forked: the parent may hand out the same pairs, so
+            # none of them are safe to use here
+            self._start()
+        try:
+            pair = self._pairs.popleft() # atomic, so each pair goes once
+        except IndexError:
+            pair = None
+        if len(self._pairs) < self.low_watermark:
+            self._wakeup.set()
+        return pair
+
+    def fill(self, count=None):
+        """Compute pairs until the pool holds 'size' of them (or until
+        'count' more have been added)."""
+        g = self.params.group
+        added = 0
+        while not self._closed and len(self._pairs) < self.size:
+            if count is not None and added >= count:
+                break
+            x = g.random_scalar(self.entropy_f)
+            self._pairs.append((x, g.Base.scalarmult(x)))
+            added += 1
+
+    def close(self):
+        """Stop refilling, and discard any unused pairs."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._pairs.clear()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                return
+            self.fill()
@@ -1,4 +1,5 @@
-import os, json
+import os, json, threading, functools
+from collections import OrderedDict
 from binascii import hexlify, unhexlify
 from hashlib import sha256
 from .params import _Params
@@ -19,6 +20,8 @@ class OffSides(SPAKEError):
     expecting the opposite side."""
 class SerializedTooEarly(SPAKEError):
     pass
+class FinishedTooEarly(SPAKEError):
+    """finish() was called before start()."""
 class WrongSideSerialized(SPAKEError):
     """You tried to unserialize data stored for the other side."""
 class WrongGroupError(SPAKEError):
@@ -30,6 +33,13 @@ SideA = b"A"
 SideB = b"B"
 SideSymmetric = b"S"
 
+def _split_message(inbound_side_and_message):
+    # finish() accepts any bytes-like object, e.g. a memoryview slice of a
+    # receive buffer. The message is copied exactly once, because we keep it
+    # (for the transcript) and the caller may reuse their buffer.
+    m = memoryview(inbound_side_and_message)
+    return bytes(m[0:1]), bytes(m[1:])
+
 # x = random(Zp)
 # X = scalarmult(g, x)
 # X* = X + scalarmult(M, int(pw))
@@ -43,21 +53,118 @@ SideSymmetric = b"S"
 
 # to serialize intermediate state, just remember x and A-vs-B. And M/N.
 
+# The transcript starts with H(pw)+H(idA)+H(idB) (or H(pw)+H(idSymmetric)),
+# which is the same for every session between the same parties with the
+# same password. A TranscriptContext hashes that part once, and each
+# finish() copies the hash object and adds the messages. The identity
+# digests are cached too, since servers tend to use the same few.
+
+@functools.lru_cache(maxsize=1024)
+def _id_digest(identity):
+    return sha256(identity).digest()
+
+class TranscriptContext:
+    def __init__(self, pw, identities, pw_digest=None):
+        if pw_digest is None:
+            pw_digest = sha256(pw).digest()
+        self._hash = sha256(pw_digest)
+        for identity in identities:
+            self._hash.update(_id_digest(bytes(identity)))
+
+    def finalize(self, *pieces):
+        h = self._hash.copy()
+        for piece in pieces:
+            h.update(piece)
+        return h.digest()
+
 def finalize_SPAKE2(idA, idB, X_msg, Y_msg, K_bytes, pw):
-    transcript = b"".join([sha256(pw).digest(),
-                           sha256(idA).digest(), sha256(idB).digest(),
-                           X_msg, Y_msg, K_bytes])
-    key = sha256(transcript).digest()
-    return key
+    transcript = TranscriptContext(pw, (idA, idB))
+    return transcript.finalize(X_msg, Y_msg, K_bytes)
 
 def finalize_SPAKE2_symmetric(idSymmetric, msg1, msg2, K_bytes, pw):
+    transcript = TranscriptContext(pw, (idSymmetric,))
+    return _finalize_symmetric(transcript, msg1, msg2, K_bytes)
+
+def _finalize_symmetric(transcript, msg1, msg2, K_bytes):
     # since we don't know which side is which, we must sort the messages
     first_msg, second_msg = sorted([msg1, msg2])
-    transcript = b"".join([sha256(pw).digest(),
-                           sha256(idSymmetric).digest(),
-                           first_msg, second_msg, K_bytes])
-    key = sha256(transcript).digest()
-    return key
+    return transcript.finalize(first_msg, second_msg, K_bytes)
+
+class PreparedPassword:
+    """A password that will be used for many sessions with the same params,
+    like a pairing code shared by a fleet of devices, or a server-side
+    login verifier. Pass it to SPAKE2_A/SPAKE2_B/SPAKE2_Symmetric in place
+    of the password bytes.
+
+    The password scalar is computed once, here. pw*M, pw*N, and pw*S are
+    each computed the first time a session needs them, and then reused,
+    which saves two of the four scalar multiplications in every session.
+    """
+    def __init__(self, password, params=DefaultParams):
+        assert isinstance(password, bytes)
+        assert isinstance(params, _Params), repr(params)
+        self.password = password
+        self.params = params
+        self.pw_scalar = params.group.password_to_scalar(password)
+        self._pw_digest = sha256(password).digest()
+        self._blinded = {}
+        self._transcripts = OrderedDict()
+        self._lock = threading.Lock()
+
+    MAX_TRANSCRIPTS = 64
+
+    def _transcript(self, identities):
+        # one TranscriptContext per set of identities, for the most
+        # recently used ones
+        with self._lock:
+            transcript = self._transcripts.get(identities)
+            if transcript is None:
+                transcript = TranscriptContext(self.password, identities,
+                                               self._pw_digest)
+                self._transcripts[identities] = transcript
+                while len(self._transcripts) > self.MAX_TRANSCRIPTS:
+                    self._transcripts.popitem(last=False)
+            else:
+                self._transcripts.move_to_end(identities)
+            return transcript
+
+    def _times(self, element):
+        # pw*element, for the params' M, N, or S. We hold on to the element
+        # too, so its id() can't be reused while it is in the dict.
+        try:
+            return self._blinded[id(element)][1]
+        except KeyError:
+            pass
+        with self._lock:
+            if id(element) not in self._blinded:
+                self._blinded[id(element)] = (element,
+                                              element.scalarmult(
+                                                  self.pw_scalar))
+            return self._blinded[id(element)][1]
+
+class PreparedPasswordCache:
+    """A bounded, least-recently-used cache of PreparedPassword objects,
+    keyed by (params fingerprint, password). This keeps the passwords, and
+    values derived from them, in memory until they are evicted."""
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._prepared = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, password, params=DefaultParams):
+        key = (params.fingerprint(), password)
+        with self._lock:
+            prepared = self._prepared.get(key)
+            if prepared is not None:
+                self._prepared.move_to_end(key)
+                return prepared
+        prepared = PreparedPassword(password, params)
+        with self._lock:
+            self._prepared[key] = prepared
+            self._prepared.move_to_end(key)
+            while len(self._prepared) > self.maxsize:
+                self._prepared.popitem(last=False)
+        return prepared
 
 class _SPAKE2_Base:
     "This class manages one side of a SPAKE2 key negotiation."
@@ -65,58 +172,129 @@ class _SPAKE2_Base:
     side = None # set by the subclass
 
     def __init__(self, password,
-                 params=DefaultParams, entropy_f=os.urandom):
-        assert isinstance(password, bytes)
-        self.pw = password
-        self.pw_scalar = params.group.password_to_scalar(password)
-
+                 params=DefaultParams, entropy_f=os.urandom, pool=None):
         assert isinstance(params, _Params), repr(params)
+        if (pool is not None and
+            pool.params.fingerprint() != params.fingerprint()):
+            raise WrongGroupError("EphemeralPool was made for different "
+                                  "params")
+        self._pool = pool
+        self._prepared = None
+        if isinstance(password, PreparedPassword):
+            if password.params.fingerprint() != params.fingerprint():
+                raise WrongGroupError("PreparedPassword was made for "
+                                      "different params")
+            self._prepared = password
+            self.pw = password.password
+            self.pw_scalar = password.pw_scalar
+        else:
+            assert isinstance(password, bytes)
+            self.pw = password
+            self.pw_scalar = params.group.password_to_scalar(password)
+
         self.params = params
         self.entropy_f = entropy_f
 
         self._started = False
         self._finished = False
+        # pw*N (or pw*M, or pw*S), if we happen to have it already
+        self._pw_unblinding = None
 
     def start(self):
+        message_elem = self._start_element()
+        self.outbound_message = message_elem.to_bytes()
+        return self._outbound_side_and_message()
+
+    def _start_element(self):
+        # the part of start() that comes before encoding, which
+        # batch.start_all() does for many instances at once
         if self._started:
             raise OnlyCallStartOnce("start() can only be called once")
-        self._started = True
 
         g = self.params.group
-        self.xy_scalar = g.random_scalar(self.entropy_f)
-        self.xy_elem = g.Base.scalarmult(self.xy_scalar)
-        self.compute_outbound_message()
+        # a pool (if we have one) hands out x and x*Base, computed ahead of
+        # time. It falls back to doing the work here when it runs dry.
+        pair = self._pool.take() if self._pool is not None else None
+        if pair is None:
+            self.xy_scalar = g.random_scalar(self.entropy_f)
+            element = self._compute_outbound_element()
+        else:
+            (self.xy_scalar, xy_elem) = pair
+            element = self._compute_outbound_element(xy_elem)
+        # only now, so that a failure above (e.g. from entropy_f) leaves
+        # the instance unstarted rather than half-started
+        self._started = True
+        return element
+
+    def _outbound_side_and_message(self):
         # Guard against both sides using the same side= by adding a side byte
         # to the message. This is not included in the transcript hash at the
         # end.
-        outbound_side_and_message = self.side + self.outbound_message
-        return outbound_side_and_message
+        return self.side + self.outbound_message
 
     def compute_outbound_message(self):
-        #message_elem = self.xy_elem + (self.my_blinding() * self.pw_scalar)
-        pw_blinding = self.my_blinding().scalarmult(self.pw_scalar)
-        message_elem = self.xy_elem.add(pw_blinding)
-        self.outbound_message = message_elem.to_bytes()
+        self.outbound_message = self._compute_outbound_element().to_bytes()
+
+    def _compute_outbound_element(self, xy_elem=None):
+        #message_elem = (g.Base * self.xy_scalar) +
+        #               (self.my_blinding() * self.pw_scalar)
+        g = self.params.group
+        if self._prepared is not None:
+            # pw*M and pw*N (or pw*S) are shared with other sessions
+            self._pw_unblinding = self._prepared._times(self.my_unblinding())
+            pw_blinding = self._prepared._times(self.my_blinding())
+        elif self.my_blinding() is self.my_unblinding():
+            # symmetric mode: finish() will need this same pw*S, so compute
+            # it on its own and keep it around
+            self._pw_unblinding = self.my_blinding().scalarmult(self.pw_scalar)
+            pw_blinding = self._pw_unblinding
+        elif xy_elem is not None:
+            pw_blinding = self.my_blinding().scalarmult(self.pw_scalar)
+        else:
+            return g.multi_scalarmult([(self.xy_scalar, g.Base),
+                                       (self.pw_scalar, self.my_blinding())])
+        if xy_elem is None:
+            xy_elem = g.Base.scalarmult(self.xy_scalar)
+        return xy_elem.add(pw_blinding)
 
     def finish(self, inbound_side_and_message):
+        self.inbound_message = self._begin_finish(inbound_side_and_message)
+        g = self.params.group
+        inbound_elem = g.bytes_to_element(self.inbound_message)
+        K_bytes = self._K_element(inbound_elem).to_bytes()
+        key = self._finalize(K_bytes)
+        return key
+
+    def _begin_finish(self, inbound_side_and_message):
+        # finish() is split up around its decoding and encoding steps, so
+        # that batch.finish_many() can do those for many instances at once
+        if not self._started:
+            raise FinishedTooEarly("call .start() before .finish()")
         if self._finished:
             raise OnlyCallFinishOnce("finish() can only be called once")
         self._finished = True
+        return self._extract_message(inbound_side_and_message)
 
-        self.inbound_message = self._extract_message(inbound_side_and_message)
-
+    def _K_element(self, inbound_elem):
         g = self.params.group
-        inbound_elem = g.bytes_to_element(self.inbound_message)
         if inbound_elem.to_bytes() == self.outbound_message:
             raise ReflectionThwarted
-        #K_elem = (inbound_elem + (self.my_unblinding() * -self.pw_scalar)
+        #K_elem = (inbound_elem - (self.my_unblinding() * self.pw_scalar)
         #          ) * self.xy_scalar
-        pw_unblinding = self.my_unblinding().scalarmult(-self.pw_scalar)
-        K_elem = inbound_elem.add(pw_unblinding).scalarmult(self.xy_scalar)
-        K_bytes = K_elem.to_bytes()
-        key = self._finalize(K_bytes)
-        return key
-
+        if self._pw_unblinding is not None:
+            return inbound_elem.subtract(self._pw_unblinding
+                                         ).scalarmult(self.xy_scalar)
+        # otherwise compute it as a single joint multiplication:
+        #K_elem = (inbound_elem * self.xy_scalar) +
+        #         (self.my_unblinding() * -(self.xy_scalar*self.pw_scalar))
+        return g.multi_scalarmult([(self.xy_scalar, inbound_elem),
+                                   (-self.xy_scalar * self.pw_scalar,
+                                    self.my_unblinding())])
+
+    def _transcript(self, identities):
+        if self._prepared is not None:
+            return self._prepared._transcript(identities)
+        return TranscriptContext(self.pw, identities)
 
     def hash_params(self):
         # We can't really reconstruct the group from static data, but we'll
@@ -144,9 +322,9 @@ class _SPAKE2_Base:
 
 class _SPAKE2_Asymmetric(_SPAKE2_Base):
     def __init__(self, password, idA=b"", idB=b"",
-                 params=DefaultParams, entropy_f=os.urandom):
+                 params=DefaultParams, entropy_f=os.urandom, pool=None):
         _SPAKE2_Base.__init__(self, password,
-                              params=params, entropy_f=entropy_f)
+                              params=params, entropy_f=entropy_f, pool=pool)
 
         assert isinstance(idA, bytes), repr(idA)
         assert isinstance(idB, bytes), repr(idB)
@@ -154,8 +332,7 @@ class _SPAKE2_Asymmetric(_SPAKE2_Base):
         self.idB = idB
 
     def _extract_message(self, inbound_side_and_message):
-        other_side = inbound_side_and_message[0:1]
-        inbound_message = inbound_side_and_message[1:]
+        other_side, inbound_message = _split_message(inbound_side_and_message)
 
         if other_side not in (SideA, SideB):
             raise OffSides("I don't know what side they're on")
@@ -167,9 +344,8 @@ class _SPAKE2_Asymmetric(_SPAKE2_Base):
         return inbound_message
 
     def _finalize(self, K_bytes):
-        return finalize_SPAKE2(self.idA, self.idB,
-                               self.X_msg(), self.Y_msg(),
-                               K_bytes, self.pw)
+        return self._transcript((self.idA, self.idB)).finalize(
+            self.X_msg(), self.Y_msg(), K_bytes)
 
     def _serialize_to_dict(self):
         g = self.params.group
@@ -200,7 +376,6 @@ class _SPAKE2_Asymmetric(_SPAKE2_Base):
         self._started = True
         xy_scalar_bytes = unhexlify(d["xy_scalar"].encode("ascii"))
         self.xy_scalar = g.bytes_to_scalar(xy_scalar_bytes)
-        self.xy_elem = g.Base.scalarmult(self.xy_scalar)
         self.compute_outbound_message()
         return self
 
@@ -224,29 +399,29 @@ class SPAKE2_B(_SPAKE2_Asymmetric):
 class SPAKE2_Symmetric(_SPAKE2_Base):
     side = SideSymmetric
     def __init__(self, password, idSymmetric=b"",
-                 params=DefaultParams, entropy_f=os.urandom):
+                 params=DefaultParams, entropy_f=os.urandom, pool=None):
         _SPAKE2_Base.__init__(self, password,
-                              params=params, entropy_f=entropy_f)
+                              params=params, entropy_f=entropy_f, pool=pool)
         self.idSymmetric = idSymmetric
 
     def my_blinding(self): return self.params.S
     def my_unblinding(self): return self.params.S
 
     def _extract_message(self, inbound_side_and_message):
-        other_side = inbound_side_and_message[0:1]
-        inbound_message = inbound_side_and_message[1:]
+        other_side, inbound_message = _split_message(inbound_side_and_message)
         if other_side == SideA:
             raise OffSides("I'm Symmetric, but I got a message from A")
         if other_side == SideB:
             raise OffSides("I'm Symmetric, but I got a message from B")
-        assert other_side == SideSymmetric
+        if other_side != SideSymmetric:
+            raise OffSides("I'm Symmetric, but I don't know what side they're"
+                           " on")
         return inbound_message
 
     def _finalize(self, K_bytes):
-        return finalize_SPAKE2_symmetric(self.idSymmetric,
-                                         self.inbound_message,
-                                         self.outbound_message,
-                                         K_bytes, self.pw)
+        return _finalize_symmetric(self._transcript((self.idSymmetric,)),
+                                   self.inbound_message,
+                                   self.outbound_message, K_bytes)
 
     def hash_params(self):
         g = self.params.group
@@ -283,7 +458,6 @@ class SPAKE2_Symmetric(_SPAKE2_Base):
         self._started = True
         xy_scalar_bytes = unhexlify(d["xy_scalar"].encode("ascii"))
         self.xy_scalar = g.bytes_to_scalar(xy_scalar_bytes)
-        self.xy_elem = g.Base.scalarmult(self.xy_scalar)
         self.compute_outbound_message()
         return self
 
@@ -6,7 +6,8 @@ from cryptography.hazmat.primitives import hashes
 from .myhkdf import HKDF as myHKDF
 from spake2 import groups, ed25519_group
 from spake2.spake2 import (SPAKE2_A, SPAKE2_B, SPAKE2_Symmetric,
-                           finalize_SPAKE2, finalize_SPAKE2_symmetric)
+                           finalize_SPAKE2, finalize_SPAKE2_symmetric,
+                           TranscriptContext)
 from .common import PRG
 
 class TestPRG(unittest.TestCase):
@@ -226,6 +227,23 @@ class TestHKDF(unittest.TestCase):
             #print(hexlify(digest))
             expected = vector["OKM"].encode("ascii")
             self.assertEqual(hexlify(digest), expected, vector)
+            if salt.strip(b"\x00") == b"":
+                # the library's own HKDF only does (equivalent) empty salts
+                self.assertEqual(hexlify(groups._hkdf(IKM, vector["L"], info)),
+                                 expected, vector)
+
+    def test_library_hkdf(self):
+        # groups._hkdf must match the "cryptography" HKDF for everything the
+        # library derives: password scalars (scalar size + 16 bytes), and
+        # arbitrary-element seeds (element size + 16 bytes)
+        fr = PRG(b"hkdf")
+        for info in [b"SPAKE2 pw", b"SPAKE2 arbitrary element"]:
+            for length in [1, 32, 36, 44, 48, 64, 144, 272, 400]:
+                data = fr(length % 20)
+                h = hkdf.HKDF(algorithm=hashes.SHA256(), length=length,
+                              salt=b"", info=info)
+                self.assertEqual(groups._hkdf(data, length, info),
+                                 h.derive(data), (info, length))
 
 class Finalize(unittest.TestCase):
     def test_asymmetric(self):
@@ -242,3 +260,20 @@ class Finalize(unittest.TestCase):
                                          b"Y_msg", b"X_msg",
                                          b"K_bytes", b"pw")
         self.assertEqual(hexlify(key1), hexlify(key2))
+
+    def test_context(self):
+        # a reused context must give the same bytes as the original
+        # transcript: H(pw)+H(idA)+H(idB)+X+Y+K
+        transcript = b"".join([sha256(b"pw").digest(),
+                               sha256(b"idA").digest(),
+                               sha256(b"idB").digest(),
+                               b"X_msg", b"Y_msg", b"K_bytes"])
+        ctx = TranscriptContext(b"pw", (b"idA", b"idB"))
+        for i in range(2):
+            self.assertEqual(ctx.finalize(b"X_msg", b"Y_msg", b"K_bytes"),
+                             sha256(transcript).digest())
+        ctx = TranscriptContext(None, (b"idA", b"idB"),
+                                pw_digest=sha256(b"pw").digest())
+        self.assertEqual(hexlify(ctx.finalize(b"X_msg", b"Y_msg",
+                                              b"K_bytes")),
+                         b"aa02a627537543399bb1b4b430646480b6d36ab5c44842e738c8f78694d8afac")
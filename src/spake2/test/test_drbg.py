@@ -0,0 +1,69 @@
+import os, unittest
+from binascii import unhexlify
+from spake2 import _drbg as drbg
+from spake2.spake2 import SPAKE2_A, SPAKE2_B
+from .common import PRG
+
+class HMAC_DRBG(unittest.TestCase):
+    def test_vector(self):
+        # NIST CAVS HMAC_DRBG.rsp, SHA-256, no prediction resistance, no
+        # personalization or additional input, COUNT=0: instantiate, then
+        # generate twice, and compare the second output
+        entropy = unhexlify("ca851911349384bffe89de1cbdc46e68"
+                            "31e44d34a4fb935ee285dd14b71a7488"
+                            "659ba96c601dc69fc902940805ec0ca8") # plus nonce
+        d = drbg.DRBG(entropy_source=lambda n: entropy[:n],
+                      personalization=b"")
+        d._generate(128)
+        expected = unhexlify(
+            "e528e9abf2dece54d47c7e75e5fe302149f817ea9fb4bee6f4199697d04d5b89"
+            "d54fbb978a15b5c443c9ec21036d2460b6f73ebad0dc2aba6e624abf07745bc1"
+            "07694bb7547bb0995f70de25d6b29e2d3011bb19d27676c07162c8b5ccde0668"
+            "961df86803482cb37ed6d5c0bb8d50cf1f50d476aa0458bdaba806f48be9dcb8")
+        self.assertEqual(d._generate(128), expected)
+
+    def test_buffering(self):
+        # however the requests are split up, the bytes come out the same
+        d1 = drbg.DRBG(entropy_source=PRG(b"seed"), buffer_size=100)
+        d2 = drbg.DRBG(entropy_source=PRG(b"seed"), buffer_size=100)
+        data = d1(10) + d1(1) + d1(250) + d1(0) + d1(39)
+        self.assertEqual(len(data), 300)
+        self.assertEqual(d2(300), data)
+        d3 = drbg.DRBG(entropy_source=PRG(b"other"), buffer_size=100)
+        self.assertNotEqual(d3(300), data)
+
+    def test_reseed(self):
+        calls = []
+        source = PRG(b"seed")
+        def counting_source(n):
+            calls.append(n)
+            return source(n)
+        d = drbg.DRBG(entropy_source=counting_source, buffer_size=32,
+                      reseed_interval=2)
+        self.assertEqual(calls, [48])
+        d(32*5)
+        self.assertEqual(calls, [48, 32, 32])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork()")
+    def test_fork(self):
+        d = drbg.DRBG()
+        d(1) # fill the buffer before forking
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.write(w, d(32))
+            finally:
+                os._exit(0)
+        os.close(w)
+        child = os.read(r, 32)
+        os.close(r)
+        os.waitpid(pid, 0)
+        self.assertEqual(len(child), 32)
+        self.assertNotEqual(child, d(32))
+
+    def test_spake2(self):
+        d = drbg.DRBG()
+        sA,sB = SPAKE2_A(b"pw", entropy_f=d), SPAKE2_B(b"pw", entropy_f=d)
+        m1A,m1B = sA.start(), sB.start()
+        self.assertEqual(sA.finish(m1B), sB.finish(m1A))
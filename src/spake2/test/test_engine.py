@@ -0,0 +1,154 @@
+import time, queue, unittest
+from spake2 import spake2
+from spake2.engine import (HandshakeEngine, StartJob, FinishJob,
+                           SessionRouter, UnknownSession)
+from spake2.parameters.i1024 import Params1024
+from spake2.spake2 import SPAKE2_A, SPAKE2_B, SPAKE2_Symmetric
+
+class Engine(unittest.TestCase):
+    def setUp(self):
+        self.engine = HandshakeEngine(workers=2, max_pending=8)
+    def tearDown(self):
+        self.engine.close(cancel_pending=True)
+
+    def test_handshake(self):
+        e = self.engine
+        (msg, state) = e.submit_start(b"pw", idA=b"a").result()
+        sB = SPAKE2_B(b"pw", idA=b"a")
+        msgB = sB.start()
+        self.assertEqual(e.submit_finish(state, msgB).result(),
+                         sB.finish(msg))
+        (msg, state) = e.submit_start(b"pw", side="S").result()
+        sS = SPAKE2_Symmetric(b"pw")
+        msgS = sS.start()
+        self.assertEqual(e.submit_finish(state, msgS).result(),
+                         sS.finish(msg))
+        # the key comes back through the future as an exception
+        f = e.submit_finish(state, msg)
+        self.assertRaises(spake2.ReflectionThwarted, f.result)
+
+    def test_stream(self):
+        peers = [SPAKE2_A(b"pw%d" % i) for i in range(20)]
+        jobs = [(i, StartJob(b"pw%d" % i, side="B")) for i in range(20)]
+        started = dict(self.engine.stream(jobs))
+        self.assertEqual(sorted(started), list(range(20)))
+        peer_msgs = [p.start() for p in peers]
+        peer_msgs[3] = b"B" + peer_msgs[3][1:]
+        jobs = [(i, FinishJob(started[i][1], peer_msgs[i]))
+                for i in range(20)]
+        results = dict(self.engine.stream(iter(jobs)))
+        self.assertIsInstance(results[3], spake2.OffSides)
+        for i in range(20):
+            if i != 3:
+                self.assertEqual(results[i], peers[i].finish(started[i][0]))
+
+    def test_backpressure(self):
+        e = HandshakeEngine(workers=1, max_pending=1, params=Params1024,
+                            password_cache_size=4)
+        try:
+            # the worker is still starting up, so this one can't be done yet
+            f = e.submit_start(b"pw")
+            self.assertRaises(queue.Full, e.submit_start, b"pw", block=False)
+            self.assertRaises(queue.Full, e.submit_start, b"pw", timeout=0.01)
+            f.result()
+            e.submit_start(b"pw", timeout=10).result()
+        finally:
+            e.close()
+
+    def test_cancel(self):
+        e = self.engine
+        fs = [e.submit_start(b"pw") for i in range(8)]
+        cancelled = e.cancel_pending()
+        self.assertGreater(cancelled, 0)
+        self.assertEqual(sum(f.cancelled() for f in fs), cancelled)
+        for f in fs:
+            if not f.cancelled():
+                f.result()
+        # abandoning a stream cancels whatever it hasn't started
+        stream = e.stream((i, StartJob(b"pw")) for i in range(100))
+        next(stream)
+        stream.close()
+        e.submit_start(b"pw").result()
+
+class Router(unittest.TestCase):
+    def setUp(self):
+        self.router = SessionRouter(shards=2, max_pending=8)
+    def tearDown(self):
+        self.router.close()
+
+    def test_handshake(self):
+        r = self.router
+        ids = [b"session-%d" % i for i in range(6)]
+        self.assertEqual(set(r.shard_for(sid) for sid in ids), set([0, 1]))
+        msgs = [r.start(sid, b"pw", side="B", idA=b"a") for sid in ids]
+        peers = [SPAKE2_A(b"pw", idA=b"a") for sid in ids]
+        keys = [r.finish(sid, p.start()) for (sid, p) in zip(ids, peers)]
+        for (p, m, k) in zip(peers, msgs, keys):
+            self.assertEqual(k.result(), p.finish(m.result()))
+        msg = r.start(b"sym", b"pw", side="S").result()
+        sS = SPAKE2_Symmetric(b"pw")
+        self.assertEqual(r.finish(b"sym", sS.start()).result(),
+                         sS.finish(msg))
+
+    def test_errors(self):
+        r = self.router
+        self.assertRaises(UnknownSession, r.finish(b"nope", b"A").result)
+        msg = r.start(b"s1", b"pw").result()
+        self.assertRaises(ValueError, r.start(b"s1", b"pw").result)
+        # finish() consumes the session, even when it fails
+        self.assertRaises(spake2.OffSides, r.finish(b"s1", msg).result)
+        self.assertRaises(UnknownSession, r.finish(b"s1", msg).result)
+        r.start(b"s2", b"pw").result()
+        self.assertEqual(r.discard(b"s2").result(), True)
+        self.assertEqual(r.discard(b"s2").result(), False)
+
+    def test_limits(self):
+        r = SessionRouter(shards=1, max_pending=1, max_sessions=2,
+                          params=Params1024)
+        try:
+            # the worker is still starting up, so this one can't be done yet
+            f = r.start(b"s1", b"pw")
+            self.assertRaises(queue.Full, r.start, b"s2", b"pw",
+                              block=False)
+            f.result()
+            r.start(b"s2", b"pw").result()
+            r.start(b"s3", b"pw").result() # evicts s1
+            self.assertRaises(UnknownSession,
+                              r.finish(b"s1", b"B" + b"\x00").result)
+            peer = SPAKE2_B(b"pw", params=Params1024)
+            r.finish(b"s2", peer.start()).result()
+        finally:
+            r.close()
+        self.assertRaises(RuntimeError, r.start, b"s4", b"pw")
+
+    def test_dead_worker(self):
+        r = self.router
+        ids = [b"session-%d" % i for i in range(20)]
+        live = [sid for sid in ids if r.shard_for(sid) == 0]
+        dead = [sid for sid in ids if r.shard_for(sid) == 1]
+        r.start(dead[0], b"pw").result()
+        r._workers[1].kill()
+        f = r.start(dead[1], b"pw")
+        # keep the other shard busy, so the results queue is never idle
+        deadline = time.monotonic() + 10
+        while not f.done() and time.monotonic() < deadline:
+            r.discard(live[0]).result()
+            time.sleep(0.05)
+        self.assertTrue(f.done())
+        self.assertRaises(RuntimeError, f.result, 0)
+        self.assertRaises(RuntimeError, r.finish(dead[0], b"A").result, 5)
+        r.start(live[1], b"pw").result()
+
+    def test_close_fails_dead_jobs(self):
+        r = SessionRouter(shards=2)
+        ids = [b"session-%d" % i for i in range(20)]
+        dead = [sid for sid in ids if r.shard_for(sid) == 1]
+        r.start(dead[0], b"pw").result()
+        r._workers[1].kill()
+        r._workers[1].join()
+        f = r.start(dead[1], b"pw")
+        r.close()
+        self.assertRaises(RuntimeError, f.result, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,14 @@
-import unittest
+import pickle, unittest
 from binascii import hexlify
 from hashlib import sha256
-from spake2 import groups, ed25519_group
+from spake2 import groups, ed25519_group, ed25519_basic
 from spake2.parameters.i1024 import Params1024
 from spake2.parameters.i2048 import Params2048
 from spake2.parameters.i3072 import Params3072
 from spake2.parameters.ed25519 import ParamsEd25519
+from spake2.params import _Params
 from spake2.spake2 import SPAKE2_A, SPAKE2_B
+from spake2.util import bytes_to_number
 from .common import PRG
 
 ALL_INTEGER_GROUPS = [groups.I1024, groups.I2048, groups.I3072]
@@ -120,6 +122,149 @@ class Group(unittest.TestCase):
             unblinded_pubkey = blinded_pubkey.add(inverse_blinding_factor)
             self.assertElementsEqual(pubkey, unblinded_pubkey)
 
+    def test_equality(self):
+        for g in ALL_GROUPS:
+            fr = PRG(b"eq")
+            s, e = random_element(g, fr)
+            same = g.Base.scalarmult(s)
+            other = g.Base.scalarmult(s+1)
+            self.assertTrue(e == same)
+            self.assertFalse(e != same)
+            self.assertTrue(e != other)
+            self.assertFalse(e == g.Zero)
+            self.assertTrue(g.Zero == g.Base.scalarmult(0))
+            # once decoded, an element remembers its encoding
+            b = e.to_bytes()
+            decoded = g.bytes_to_element(b)
+            self.assertTrue(decoded == e)
+            self.assertIs(decoded.to_bytes(), b)
+            self.assertIs(e.to_bytes(), b)
+        self.assertFalse(groups.I1024.Base == groups.I2048.Base)
+        self.assertFalse(ed25519_group.Ed25519Group.Base == groups.I1024.Base)
+        # integer-group elements stay usable as dict keys
+        g = groups.I1024
+        self.assertEqual(hash(g.Zero), hash(g.Base.scalarmult(0)))
+        self.assertEqual(len(set([g.Base, g.Base.scalarmult(1),
+                                  g.Base.scalarmult(2)])), 2)
+
+    def test_negate(self):
+        for g in ALL_GROUPS:
+            fr = PRG(b"negate")
+            _, e1 = random_element(g, fr)
+            _, e2 = random_element(g, fr)
+            self.assertElementsEqual(e1.negate(), e1.scalarmult(-1))
+            self.assertElementsEqual(e1.negate().add(e1), g.Zero)
+            self.assertElementsEqual(e1.negate().negate(), e1)
+            self.assertElementsEqual(e1.subtract(e2),
+                                     e1.add(e2.scalarmult(-1)))
+            self.assertElementsEqual(e1.subtract(e1), g.Zero)
+            self.assertElementsEqual(e1.subtract(g.Zero), e1)
+            self.assertElementsEqual(g.Zero.negate(), g.Zero)
+            self.assertElementsEqual(g.Base.negate(), g.Base.scalarmult(-1))
+
+    def test_multi_scalarmult(self):
+        for g in ALL_GROUPS:
+            fr = PRG(b"multi")
+            e1 = g.arbitrary_element(b"1")
+            e2 = g.arbitrary_element(b"2")
+            fixed = g.fixed_base_element(g.arbitrary_element(b"3"), 100000)
+            for i in range(3):
+                s1, s2 = g.random_scalar(fr), g.random_scalar(fr)
+                for (a, b) in [(e1, e2), (e1, g.Base), (fixed, e2),
+                               (fixed, g.Base)]:
+                    expected = a.scalarmult(s1).add(b.scalarmult(s2))
+                    self.assertElementsEqual(
+                        g.multi_scalarmult([(s1, a), (s2, b)]), expected)
+                    self.assertElementsEqual(
+                        g.multi_scalarmult([(-s1, a), (s2, b)]),
+                        a.scalarmult(-s1).add(b.scalarmult(s2)))
+                self.assertElementsEqual(g.multi_scalarmult([(s1, e1)]),
+                                         e1.scalarmult(s1))
+            self.assertElementsEqual(g.multi_scalarmult([(5, e1), (7, e1)]),
+                                     e1.scalarmult(12))
+            self.assertElementsEqual(g.multi_scalarmult([(5, e1), (-5, e1)]),
+                                     g.Zero)
+            self.assertElementsEqual(g.multi_scalarmult([(0, e1), (3, e2)]),
+                                     e2.scalarmult(3))
+            self.assertElementsEqual(g.multi_scalarmult([]), g.Zero)
+            self.assertRaises(TypeError, g.multi_scalarmult, [(e1, e2)])
+            self.assertRaises(TypeError, g.multi_scalarmult, [(1, 2)])
+
+    def test_integer_multi_exp(self):
+        for g in ALL_INTEGER_GROUPS:
+            fr = PRG(b"multi exp")
+            es = [g.arbitrary_element(seed)._e for seed in [b"1", b"2", b"3"]]
+            ss = [g.random_scalar(fr) for e in es] + [1, 2**40, 0]
+            for w in [1, 2, 4, 5]:
+                for n in [1, 2, 3]:
+                    terms = list(zip(ss[n:n+n], es[:n]))
+                    expected = 1
+                    for (s, e) in terms:
+                        expected = (expected * pow(e, s, g.p)) % g.p
+                    self.assertEqual(g._multi_exp(terms, w), expected,
+                                     (w, n))
+
+    def test_bytes_to_elements_verified(self):
+        for g in ALL_GROUPS:
+            fr = PRG(b"verified")
+            n = 2*groups.BATCH_MEMBERSHIP_ROUNDS + 10
+            bs = [random_element(g, fr)[1].to_bytes() for i in range(n)]
+            es = g.bytes_to_elements_verified(bs, fr)
+            self.assertEqual([e.to_bytes() for e in es], bs)
+            self.assertElementsEqual(es[5], g.bytes_to_element(bs[5]))
+            self.assertEqual(g.bytes_to_elements_verified([]), [])
+        # the real groups get a bad element with a small-order component,
+        # which a random even coefficient would have hidden
+        fr = PRG(b"bad")
+        g = groups.I1024
+        bs = [random_element(g, fr)[1].to_bytes() for i in range(n)]
+        bs[17] = groups.number_to_bytes(g.p - bytes_to_number(bs[17]), g.p)
+        with self.assertRaises(ValueError) as cm:
+            g.bytes_to_elements_verified(bs, fr)
+        self.assertIn("element 17 ", str(cm.exception))
+        g = ed25519_group.Ed25519Group
+        bs = [random_element(g, fr)[1].to_bytes() for i in range(n)]
+        # add the point of order 2, (0,-1)
+        P = ed25519_basic.bytes_to_element(bs[42])
+        order2 = ed25519_basic.ElementOfUnknownGroup(
+            ed25519_basic.xform_affine_to_extended((0, -1)))
+        bs[42] = P.add(order2).to_bytes()
+        with self.assertRaises(ValueError) as cm:
+            g.bytes_to_elements_verified(bs, fr)
+        self.assertIn("element 42 ", str(cm.exception))
+        self.assertRaises(ValueError, g.bytes_to_elements_verified,
+                          [g.Zero.to_bytes()])
+
+    def test_check_members(self):
+        # a toy group: the order-11 subgroup of Z_23*, where 22 (-1) has
+        # order 2 and 5 has order 22
+        is_member = lambda i: pow(i, 11, 23) == 1
+        mul = lambda i, j: (i * j) % 23
+        members = [i for i in range(1, 23) if is_member(i)]
+        fr = PRG(b"toy")
+        items = [members[i % len(members)] for i in range(300)]
+        self.assertEqual(groups.check_members(items, is_member, mul, 1, fr),
+                         [True] * 300)
+        items[3] = 22
+        items[200] = 5
+        items[299] = (items[299] * 22) % 23
+        expected = [True] * 300
+        expected[3] = expected[200] = expected[299] = False
+        self.assertEqual(groups.check_members(items, is_member, mul, 1, fr),
+                         expected)
+
+    def test_elements_to_bytes(self):
+        for g in ALL_GROUPS:
+            fr = PRG(b"bulk")
+            elements = [random_element(g, fr)[1] for i in range(5)]
+            elements += [g.Zero, g.Base, elements[0]]
+            expected = [e.to_bytes() for e in elements]
+            # fresh copies, so nothing is cached yet
+            fresh = [e.add(g.Zero) for e in elements]
+            self.assertEqual(g.elements_to_bytes(fresh), expected)
+            self.assertEqual([e.to_bytes() for e in fresh], expected)
+            self.assertEqual(g.elements_to_bytes([]), [])
+
     def test_password(self):
         for g in ALL_GROUPS:
             i = g.password_to_scalar(b"")
@@ -142,6 +287,210 @@ class Group(unittest.TestCase):
 
 I23 = groups.IntegerGroup(p=23, q=11, g=2)
 
+def ed25519_reference_scalarmult(pt, n):
+    # plain double-and-add, to check the windowed versions against
+    eb = ed25519_basic
+    result = eb.xform_affine_to_extended((0,1))
+    for bit in bin(n)[2:]:
+        result = eb.double_element(result)
+        if bit == "1":
+            result = eb.add_elements(result, pt)
+    return result
+
+class Ed25519Scalarmult(unittest.TestCase):
+    def assertPointsEqual(self, pt1, pt2, msg=None):
+        eb = ed25519_basic
+        self.assertEqual(eb.ElementOfUnknownGroup(pt1).to_bytes(),
+                         eb.ElementOfUnknownGroup(pt2).to_bytes(), msg)
+
+    def test_variable_base(self):
+        eb = ed25519_basic
+        L = eb.L
+        fr = PRG(b"wnaf")
+        P = eb.arbitrary_element(b"wnaf").XYTZ
+        # L-26 makes the last addition of the non-unified ladder double
+        scalars = [1, 2, 3, 15, 16, 17, 31, 32, 33, 2**252, L-1, L-2, L-26]
+        scalars += [eb.random_scalar(fr) for i in range(10)]
+        for n in scalars:
+            expected = ed25519_reference_scalarmult(P, n)
+            self.assertPointsEqual(eb.scalarmult_element(P, n), expected, n)
+            self.assertPointsEqual(eb.scalarmult_element_safe_slow(P, n),
+                                   expected, n)
+        self.assertTrue(eb.is_extended_zero(eb.scalarmult_element(P, 0)))
+        self.assertTrue(eb.is_extended_zero(eb.scalarmult_element(P, L)))
+
+    def test_unknown_group(self):
+        eb = ed25519_basic
+        # an order-4 point, plus its sum with a main-subgroup point
+        P4 = eb.xform_affine_to_extended((eb.I, 0))
+        self.assertTrue(eb.isoncurve((eb.I, 0)))
+        P = eb.add_elements(P4, eb.Base.XYTZ)
+        for n in [1, 2, 3, 4, 5, 8, eb.L, eb.L+1, 4*eb.L, 2**255+7]:
+            self.assertPointsEqual(eb.scalarmult_element_safe_slow(P4, n),
+                                   ed25519_reference_scalarmult(P4, n), n)
+            self.assertPointsEqual(eb.scalarmult_element_safe_slow(P, n),
+                                   ed25519_reference_scalarmult(P, n), n)
+        self.assertTrue(eb.is_extended_zero(
+            eb.scalarmult_element_safe_slow(P4, 4)))
+        # multi_scalarmult must notice the low-order point and use the
+        # unified formulas
+        U = eb.ElementOfUnknownGroup(P)
+        e = eb.multi_scalarmult([(3, U), (5, eb.Base)])
+        self.assertNotIsInstance(e, eb.Element)
+        self.assertEqual(e.to_bytes(),
+                         U.scalarmult(3).add(eb.Base.scalarmult(5)).to_bytes())
+        self.assertIs(eb.multi_scalarmult([(4, eb.ElementOfUnknownGroup(P4))]),
+                      eb.Zero)
+        # negation works for every point, not just subgroup members
+        self.assertNotIsInstance(U.negate(), eb.Element)
+        self.assertIs(U.negate().add(U), eb.Zero)
+        self.assertEqual(U.negate().to_bytes(),
+                         U.scalarmult(8*eb.L-1).to_bytes())
+
+class Ed25519Membership(unittest.TestCase):
+    def test_orders(self):
+        eb = ed25519_basic
+        P1 = eb.Base.XYTZ
+        P2 = eb.xform_affine_to_extended((0, eb.Q-1)) # order 2
+        P4 = eb.xform_affine_to_extended((eb.I, 0)) # order 4
+        # find a point of order 8*L, then L times that has order 8
+        for y in range(2, 1000):
+            x = eb.xrecover(y)
+            if x is None:
+                continue
+            pt = eb.xform_affine_to_extended((x, y))
+            if eb.is_extended_zero(eb.scalarmult_element_safe_slow(pt, 8*eb.L)):
+                if not eb.is_extended_zero(
+                        eb.scalarmult_element_safe_slow(pt, 4*eb.L)):
+                    P8L = pt # order 8*L
+                    break
+        P8 = eb.scalarmult_element_safe_slow(P8L, eb.L)
+        self.assertTrue(eb.is_in_main_subgroup(P1))
+        self.assertTrue(eb.is_in_main_subgroup(
+            eb.scalarmult_element(P1, 12345)))
+        self.assertTrue(eb.is_in_main_subgroup(
+            eb.scalarmult_element_safe_slow(P8L, 8)))
+        for bad in [P2, P4, P8, P8L,
+                    eb.add_elements(P1, P2), eb.add_elements(P1, P4),
+                    eb.add_elements(P1, P8)]:
+            self.assertFalse(eb.is_in_main_subgroup(bad))
+            self.assertRaises(ValueError, eb.bytes_to_element,
+                              eb.ElementOfUnknownGroup(bad).to_bytes())
+        # Zero is its own special case
+        self.assertTrue(eb.is_in_main_subgroup(eb.Zero.XYTZ))
+        self.assertRaises(ValueError, eb.bytes_to_element, eb.Zero.to_bytes())
+
+class Ed25519Encoding(unittest.TestCase):
+    def test_xrecover(self):
+        eb = ed25519_basic
+        Q = eb.Q
+        def old_xrecover(y):
+            # the two-exponentiation version we used to have
+            xx = (y*y-1) * eb.inv(eb.d*y*y+1)
+            x = pow(xx,(Q+3)//8,Q)
+            if (x*x - xx) % Q != 0: x = (x*eb.I) % Q
+            if x % 2 != 0: x = Q-x
+            return x
+        on_curve = 0
+        for y in list(range(50)) + [Q-1, Q-2, eb.B[1]]:
+            x = eb.xrecover(y)
+            expected = old_xrecover(y)
+            if eb.isoncurve([expected, y]):
+                on_curve += 1
+                self.assertEqual(x, expected, y)
+                self.assertEqual(x % 2, 0)
+            else:
+                self.assertIs(x, None, y)
+        self.assertTrue(10 < on_curve < 45, on_curve)
+        self.assertEqual(eb.xrecover(1), 0)
+        self.assertRaises(eb.NotOnCurve, eb.decodepoint,
+                          eb.scalar_to_bytes(2))
+
+
+    def test_noncanonical(self):
+        eb = ed25519_basic
+        # y=1 with the sign bit set is a second encoding of x=0 (Zero), and
+        # y=Q+1 is a third one. Neither may be remembered as the encoding.
+        for y, sign in [(1, True), (eb.Q+1, False), (eb.Q+1, True)]:
+            b = eb.encodepoint((1 if sign else 0, y))
+            e = eb.bytes_to_unknown_group_element(b)
+            self.assertEqual(e.to_bytes(), eb._zero_bytes)
+            self.assertTrue(e == eb.Zero)
+        # same for trailing garbage
+        b = eb.Base.to_bytes()
+        e = eb.bytes_to_element(b + b"extra")
+        self.assertEqual(e.to_bytes(), b)
+        self.assertTrue(e == eb.Base)
+
+class FixedBase(unittest.TestCase):
+    assertElementsEqual = Group.assertElementsEqual
+
+    def test_ed25519_base(self):
+        eb = ed25519_basic
+        L = eb.L
+        fr = PRG(b"fixed")
+        scalars = [1, 2, 7, 8, 9, 15, 16, 17, 2**252, L-1, L-8, L-9]
+        scalars += [eb.random_scalar(fr) for i in range(10)]
+        eb.Base.scalarmult(1) # make sure the table gets built
+        for s in scalars:
+            slow = eb.Element(eb.scalarmult_element(eb.Base.XYTZ, s))
+            self.assertEqual(eb.Base.scalarmult(s).to_bytes(),
+                             slow.to_bytes(), s)
+        self.assertIs(eb.Base.scalarmult(0), eb.Zero)
+        self.assertIs(eb.Base.scalarmult(L), eb.Zero)
+
+    def test_integer_base(self):
+        for g in ALL_INTEGER_GROUPS:
+            fr = PRG(b"integer base")
+            self.assertIsInstance(g.Base, groups._FixedBaseElement)
+            scalars = [1, 2, g.q-1, -1, 0]
+            scalars += [g.random_scalar(fr) for i in range(4)]
+            g.Base.scalarmult(1) # make sure the table gets built
+            for s in scalars:
+                self.assertEqual(g.Base.scalarmult(s)._e,
+                                 pow(g.Base._e, s % g.q, g.p), s)
+            self.assertIsNot(g.Base._table, None)
+
+    def test_windows(self):
+        eb = ed25519_basic
+        fr = PRG(b"windows")
+        s = eb.random_scalar(fr)
+        expected = eb.Base.scalarmult(s).to_bytes()
+        for w in [2, 3, 5, 6]:
+            e = eb.FixedBaseElement(eb.Base.XYTZ, w=w)
+            # the first call uses the ladder, the second builds the table
+            self.assertEqual(e.scalarmult(s).to_bytes(), expected, w)
+            self.assertIs(e._table, None)
+            self.assertEqual(e.scalarmult(s).to_bytes(), expected, w)
+            self.assertIsNot(e._table, None)
+            self.assertEqual(e.scalarmult(eb.L-1).to_bytes(),
+                             eb.Base.scalarmult(-1).to_bytes(), w)
+
+    def test_blinding_tables(self):
+        for g in ALL_GROUPS:
+            fr = PRG(b"blinding")
+            e = g.arbitrary_element(b"M")
+            scalars = [1, 2, g.order()-1, -1, 0]
+            scalars += [g.random_scalar(fr) for i in range(4)]
+            expected = [e.scalarmult(s).to_bytes() for s in scalars]
+            for budget in [0, 10000, 100000, 1000000]:
+                fe = g.fixed_base_element(e, budget)
+                self.assertElementsEqual(fe, e)
+                got = [fe.scalarmult(s).to_bytes() for s in scalars]
+                self.assertEqual(got, expected, (g, budget))
+                if budget == 0:
+                    self.assertIs(fe, e)
+                if budget == 1000000:
+                    self.assertIsNot(fe._table, None)
+
+    def test_params_budget(self):
+        p = _Params(groups.I1024, table_bytes=0)
+        self.assertElementsEqual(p.M, Params1024.M)
+        self.assertIs(type(p.M), type(groups.I1024.Zero))
+        p = _Params(ed25519_group.Ed25519Group, table_bytes=0)
+        self.assertElementsEqual(p.S, ParamsEd25519.S)
+        self.assertIsInstance(ParamsEd25519.S, ed25519_basic.FixedBaseElement)
+
 class Parameters(unittest.TestCase):
     def test_params(self):
         for p in ALL_PARAMS:
@@ -167,3 +516,56 @@ class Parameters(unittest.TestCase):
         kA,kB = sA.finish(m1B), sB.finish(m1A)
         self.assertEqual(hexlify(kA), hexlify(kB))
         self.assertEqual(len(kA), len(sha256().digest()))
+
+    def test_lazy(self):
+        p = _Params(groups.I1024, M=b"lazy M")
+        self.assertIs(p._M, None)
+        M = p.M
+        self.assertIs(p.M, M)
+        self.assertElementsEqual(M, groups.I1024.arbitrary_element(b"lazy M"))
+        # the groups module builds each group once, on first use
+        self.assertIs(groups.I1024, groups.I1024)
+        self.assertRaises(AttributeError, getattr, groups, "I4096")
+
+    def test_pickle(self):
+        # groups pickle by name, and params by their seeds
+        for p in [Params1024, ParamsEd25519, _Params(groups.I1024, M=b"x")]:
+            p2 = pickle.loads(pickle.dumps(p))
+            self.assertIs(p2.group, p.group)
+            self.assertEqual(p2.fingerprint(), p.fingerprint())
+        g = groups.IntegerGroup(p=23, q=11, g=4)
+        g2 = pickle.loads(pickle.dumps(g))
+        self.assertEqual((g2.p, g2.q, g2.Base), (23, 11, g2.Base))
+        self.assertEqual(g2.Base._e, 4)
+
+    def test_warm(self):
+        p = _Params(groups.I1024, M=b"warm M").warm()
+        self.assertIsNot(p.M._table, None)
+        self.assertIsNot(p.group.Base._table, None)
+        _Params(groups.I1024, table_bytes=0).warm() # no tables at all
+
+    def test_validate(self):
+        for p in ALL_PARAMS:
+            self.assertIs(p.validate(), p)
+            self.assertIs(p.validate(), p) # only does the work once
+        g = groups.I1024
+        bad = groups.IntegerGroup(p=g.p, q=g.q, g=2)
+        self.assertRaises(ValueError, bad.validate)
+        self.assertRaises(ValueError, _Params(bad).validate)
+        self.assertRaises(ValueError, _Params(g, M=b"1", N=b"1").validate)
+
+    assertElementsEqual = Group.assertElementsEqual
+
+    def test_known_elements(self):
+        eb = ed25519_basic
+        self.assertEqual(sorted(eb.KNOWN_ARBITRARY_ELEMENTS),
+                         [b"", b"M", b"N", b"symmetric"])
+        for (seed, known) in eb.KNOWN_ARBITRARY_ELEMENTS.items():
+            self.assertEqual(eb.derive_arbitrary_element(seed).to_bytes(),
+                             known, seed)
+            e = eb.arbitrary_element(seed)
+            self.assertIsInstance(e, eb.Element)
+            self.assertTrue(e == eb.bytes_to_element(known))
+        self.assertEqual(ParamsEd25519.M.to_bytes(),
+                         eb.KNOWN_ARBITRARY_ELEMENTS[b"M"])
+        eb.check_known_arbitrary_elements()
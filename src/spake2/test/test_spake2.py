@@ -1,6 +1,7 @@
 
-import unittest
-from spake2 import spake2
+import os, sys, ast, time, subprocess, unittest
+import spake2 as spake2_package
+from spake2 import spake2, batch
 from spake2.parameters.i1024 import Params1024
 from spake2.parameters.i3072 import Params3072
 from spake2.spake2 import SPAKE2_A, SPAKE2_B, SPAKE2_Symmetric
@@ -59,6 +60,20 @@ class Basic(unittest.TestCase):
         self.assertRaises(spake2.ReflectionThwarted, s1.finish, reflected)
 
 
+    def test_buffers(self):
+        # finish() accepts a memoryview into a (reusable) receive buffer
+        for params in [spake2.DefaultParams, Params1024]:
+            pw = b"password"
+            sA,sB = SPAKE2_A(pw, params=params), SPAKE2_B(pw, params=params)
+            m1A,m1B = sA.start(), sB.start()
+            buf = bytearray(b"\x00" * 3 + m1B + b"\xff" * 5)
+            kA = sA.finish(memoryview(buf)[3:3+len(m1B)])
+            buf[:] = b"\x00" * len(buf)
+            self.assertEqual(sA.inbound_message, m1B[1:])
+            self.assertIsInstance(sA.inbound_message, bytes)
+            kB = sB.finish(bytearray(m1A))
+            self.assertEqual(hexlify(kA), hexlify(kB))
+
 class OtherEntropy(unittest.TestCase):
     def test_entropy(self):
         fr = PRG(b"seed")
@@ -92,6 +107,220 @@ class Serialize(unittest.TestCase):
         self.assertEqual(hexlify(kA), hexlify(kB))
         self.assertEqual(len(kA), len(sha256().digest()))
 
+class Batch(unittest.TestCase):
+    def test_start_all(self):
+        pw = b"password"
+        sides = [SPAKE2_A(pw), SPAKE2_A(pw, params=Params1024),
+                 SPAKE2_Symmetric(pw), SPAKE2_A(pw)]
+        peers = [SPAKE2_B(pw), SPAKE2_B(pw, params=Params1024),
+                 SPAKE2_Symmetric(pw), SPAKE2_B(pw)]
+        msgs = batch.start_all(sides)
+        for (s, p, msg) in zip(sides, peers, msgs):
+            self.assertEqual(msg, s.side + s.outbound_message)
+            peer_msg = p.start()
+            self.assertEqual(hexlify(s.finish(peer_msg)),
+                             hexlify(p.finish(msg)))
+        self.assertRaises(spake2.OnlyCallStartOnce, batch.start_all, sides)
+
+    def test_start_all_partial(self):
+        # a batch that fails leaves every instance unstarted
+        pw = b"password"
+        fresh, started = SPAKE2_A(pw), SPAKE2_A(pw)
+        started.start()
+        self.assertRaises(spake2.OnlyCallStartOnce, batch.start_all,
+                          [fresh, started])
+        self.assertRaises(spake2.OnlyCallStartOnce, batch.start_all,
+                          [fresh, fresh])
+        peer = SPAKE2_B(pw)
+        msg = fresh.start()
+        self.assertEqual(fresh.finish(peer.start()), peer.finish(msg))
+
+    def test_start_all_entropy_failure(self):
+        def broken_entropy(num_bytes):
+            raise OSError("no entropy")
+        pw = b"password"
+        a, b = SPAKE2_A(pw), SPAKE2_A(pw, entropy_f=broken_entropy)
+        self.assertRaises(OSError, batch.start_all, [a, b])
+        self.assertRaises(spake2.SerializedTooEarly, b.serialize)
+        self.assertRaises(OSError, b.start)
+        b.entropy_f = os.urandom
+        for s in [a, b]:
+            peer = SPAKE2_B(pw)
+            msg = s.start()
+            self.assertEqual(s.finish(peer.start()), peer.finish(msg))
+
+    def test_many(self):
+        for params in [spake2.DefaultParams, Params1024]:
+            g = params.group
+            pws = [b"pw%d" % (i % 3) for i in range(8)]
+            sides, msgs = batch.start_many(pws, params=params, idA=b"a")
+            self.assertEqual([s.idA for s in sides], [b"a"] * 8)
+            peers = [SPAKE2_B(pw, idA=b"a", params=params) for pw in pws]
+            inbound = [p.start() for p in peers]
+            inbound[1] = b"A" + inbound[1][1:]
+            inbound[2] = b"B" + sides[2].outbound_message
+            inbound[3] = b"B" + b"\x00" * g.element_size_bytes
+            peers[5] = SPAKE2_B(b"wrong", idA=b"a", params=params)
+            inbound[5] = peers[5].start()
+            sides[6].finish(inbound[6])
+            results = batch.finish_many(sides, inbound)
+            self.assertIsInstance(results[1], spake2.OffSides)
+            self.assertIsInstance(results[2], spake2.ReflectionThwarted)
+            self.assertIsInstance(results[3], ValueError)
+            self.assertIsInstance(results[6], spake2.OnlyCallFinishOnce)
+            for i in [0, 4, 5, 7]:
+                key = peers[i].finish(msgs[i])
+                self.assertEqual(results[i] == key, i != 5, i)
+
+    def test_many_malformed(self):
+        # garbage side bytes and unstarted instances are per-item errors
+        pw = b"password"
+        sides, msgs = batch.start_many([pw] * 4, klass=SPAKE2_Symmetric)
+        peer = SPAKE2_Symmetric(pw)
+        good = peer.start()
+        unstarted = SPAKE2_Symmetric(pw)
+        results = batch.finish_many(sides + [unstarted],
+                                    [good, b"X" + good[1:], b"", good, good])
+        self.assertIsInstance(results[1], spake2.OffSides)
+        self.assertIsInstance(results[2], spake2.OffSides)
+        self.assertIsInstance(results[4], spake2.FinishedTooEarly)
+        self.assertEqual(results[0], peer.finish(msgs[0]))
+        self.assertIsInstance(results[3], bytes)
+        # a message that isn't even bytes-like doesn't sink the batch
+        sides, msgs = batch.start_many([pw] * 3, klass=SPAKE2_Symmetric)
+        results = batch.finish_many(sides, [good, None, good])
+        self.assertIsInstance(results[1], TypeError)
+        self.assertIsInstance(results[0], bytes)
+        self.assertIsInstance(results[2], bytes)
+
+class Prepared(unittest.TestCase):
+    def test_asymmetric(self):
+        for params in [spake2.DefaultParams, Params1024]:
+            prepared = spake2.PreparedPassword(b"password", params)
+            for i in range(3):
+                sA = SPAKE2_A(prepared, params=params)
+                sB = SPAKE2_B(b"password", params=params)
+                m1A,m1B = sA.start(), sB.start()
+                kA,kB = sA.finish(m1B), sB.finish(m1A)
+                self.assertEqual(hexlify(kA), hexlify(kB))
+                sB = SPAKE2_B(prepared, params=params)
+                sA = SPAKE2_A(b"password", params=params)
+                m1A,m1B = sA.start(), sB.start()
+                kA,kB = sA.finish(m1B), sB.finish(m1A)
+                self.assertEqual(hexlify(kA), hexlify(kB))
+            # pw*M and pw*N were each computed once
+            self.assertEqual(len(prepared._blinded), 2)
+            sA = SPAKE2_A(prepared, params=params)
+            sB = SPAKE2_B(b"passwerd", params=params)
+            m1A,m1B = sA.start(), sB.start()
+            self.assertNotEqual(sA.finish(m1B), sB.finish(m1A))
+
+    def test_symmetric(self):
+        prepared = spake2.PreparedPassword(b"password")
+        s1 = SPAKE2_Symmetric(prepared)
+        s2 = SPAKE2_Symmetric(b"password")
+        m1,m2 = s1.start(), s2.start()
+        self.assertEqual(hexlify(s1.finish(m2)), hexlify(s2.finish(m1)))
+
+    def test_serialize(self):
+        prepared = spake2.PreparedPassword(b"password")
+        sA,sB = SPAKE2_A(prepared), SPAKE2_B(b"password")
+        m1A,m1B = sA.start(), sB.start()
+        sA = SPAKE2_A.from_serialized(sA.serialize())
+        self.assertEqual(hexlify(sA.finish(m1B)), hexlify(sB.finish(m1A)))
+
+    def test_wrong_params(self):
+        prepared = spake2.PreparedPassword(b"password", Params1024)
+        self.assertRaises(spake2.WrongGroupError, SPAKE2_A, prepared)
+
+    def test_transcripts(self):
+        prepared = spake2.PreparedPassword(b"password")
+        keys = []
+        for i in range(2):
+            sA = SPAKE2_A(prepared, idA=b"alice", idB=b"bob")
+            sB = SPAKE2_B(b"password", idA=b"alice", idB=b"bob")
+            m1A,m1B = sA.start(), sB.start()
+            kA,kB = sA.finish(m1B), sB.finish(m1A)
+            self.assertEqual(hexlify(kA), hexlify(kB))
+            keys.append(kA)
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(list(prepared._transcripts), [(b"alice", b"bob")])
+        s1 = SPAKE2_Symmetric(prepared, idSymmetric=b"sym")
+        s2 = SPAKE2_Symmetric(b"password", idSymmetric=bytearray(b"sym"))
+        m1,m2 = s1.start(), s2.start()
+        self.assertEqual(hexlify(s1.finish(m2)), hexlify(s2.finish(m1)))
+        self.assertEqual(len(prepared._transcripts), 2)
+
+    def test_cache(self):
+        cache = spake2.PreparedPasswordCache(maxsize=2)
+        p1 = cache.get(b"one")
+        self.assertIs(cache.get(b"one"), p1)
+        self.assertIsNot(cache.get(b"one", Params1024), p1)
+        self.assertIs(cache.get(b"one"), p1)
+        p2 = cache.get(b"two") # evicts (Params1024, b"one")
+        self.assertIs(cache.get(b"one"), p1)
+        cache.get(b"three") # evicts b"two", the least recently used
+        self.assertIsNot(cache.get(b"two"), p2)
+        self.assertEqual(len(cache._prepared), 2)
+
+class Pool(unittest.TestCase):
+    def test_pool(self):
+        pool = spake2_package.EphemeralPool(size=4, background=False)
+        self.assertEqual(len(pool), 0)
+        pool.fill(count=3)
+        self.assertEqual(len(pool), 3)
+        scalars = set()
+        for i in range(4): # the last one finds the pool empty
+            sA = SPAKE2_A(b"password", pool=pool)
+            sB = SPAKE2_B(b"password")
+            m1A,m1B = sA.start(), sB.start()
+            self.assertEqual(hexlify(sA.finish(m1B)), hexlify(sB.finish(m1A)))
+            scalars.add(sA.xy_scalar)
+        self.assertEqual(len(scalars), 4)
+        self.assertEqual(len(pool), 0)
+        pool.fill()
+        self.assertEqual(len(pool), 4)
+        # prepared passwords and symmetric sessions can use pools too
+        prepared = spake2.PreparedPassword(b"password")
+        s1 = SPAKE2_Symmetric(prepared, pool=pool)
+        s2 = SPAKE2_Symmetric(b"password", pool=pool)
+        m1,m2 = s1.start(), s2.start()
+        self.assertEqual(hexlify(s1.finish(m2)), hexlify(s2.finish(m1)))
+        self.assertEqual(len(pool), 2)
+        pool.close()
+        self.assertEqual(len(pool), 0)
+
+    def test_fork(self):
+        pool = spake2_package.EphemeralPool(size=2, background=False)
+        pool.fill()
+        pool._pid = -1 # pretend we're a child process
+        self.assertIs(pool.take(), None)
+        self.assertEqual(len(pool), 0)
+
+    def test_background(self):
+        pool = spake2_package.EphemeralPool(size=3, low_watermark=2)
+        try:
+            deadline = time.time() + 10
+            while len(pool) < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(pool), 3)
+            pool.take()
+            self.assertEqual(len(pool), 2) # at the watermark: no refill
+            pool.take()
+            deadline = time.time() + 10
+            while len(pool) < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(pool), 3)
+        finally:
+            pool.close()
+        self.assertFalse(pool._thread.is_alive())
+
+    def test_wrong_params(self):
+        pool = spake2_package.EphemeralPool(Params1024, background=False)
+        self.assertRaises(spake2.WrongGroupError, SPAKE2_A, b"pw", pool=pool)
+        sA = SPAKE2_A(b"pw", params=Params1024, pool=pool)
+        sA.start() # the pool is empty, so this does the work itself
+
 class Symmetric(unittest.TestCase):
     def test_success(self):
         pw = b"password"
@@ -171,7 +400,15 @@ class Errors(unittest.TestCase):
         sS = SPAKE2_Symmetric(pw)
         sS.start()
         self.assertRaises(spake2.OffSides, sS.finish, msgB)
+        sS = SPAKE2_Symmetric(pw)
+        msgS = sS.start()
+        self.assertRaises(spake2.OffSides, sS.finish, b"X" + msgS[1:])
 
+    def test_finish_before_start(self):
+        s = SPAKE2_A(b"password")
+        self.assertRaises(spake2.FinishedTooEarly, s.finish, b"B" + b"\0"*32)
+        # and the instance is still usable
+        s.start()
 
     def test_unserialize_wrong(self):
         s = SPAKE2_A(b"password", params=Params1024)
@@ -201,6 +438,33 @@ class Errors(unittest.TestCase):
                           SPAKE2_Symmetric.from_serialized, data, # from A
                           params=Params1024)
 
+# short-lived processes pay for "import spake2" every time, so it must not
+# pull in cryptography (or run git to find the version), and must not do
+# any expensive math up front
+IMPORT_TIME_BUDGET = 0.5 # seconds, which is very generous
+IMPORT_CHECK = """
+import sys, time
+start = time.perf_counter()
+import spake2
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("cryptography", "subprocess") if m in sys.modules]
+print(repr((elapsed, heavy)))
+"""
+
+class ImportTime(unittest.TestCase):
+    def test_import_budget(self):
+        src = os.path.dirname(os.path.dirname(spake2_package.__file__))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([src] + sys.path)
+        out = subprocess.check_output([sys.executable, "-c", IMPORT_CHECK],
+                                      env=env)
+        (elapsed, heavy) = ast.literal_eval(out.decode("ascii"))
+        self.assertEqual(heavy, [])
+        self.assertLess(elapsed, IMPORT_TIME_BUDGET)
+
+    def test_version(self):
+        self.assertIsInstance(spake2_package.__version__, str)
+        self.assertRaises(AttributeError, getattr, spake2_package, "nope")
+
 if __name__ == '__main__':
     unittest.main()
-
@@ -33,6 +33,7 @@ class Utils(unittest.TestCase):
         self.assertEqual(n2b(0x10000, 0xffffff), b"\x01\x00\x00")
         self.assertEqual(n2b(0x1, 0xffffffff), b"\x00\x00\x00\x01")
         self.assertRaises(ValueError, n2b, 0x10000, 0xff)
+        self.assertEqual(n2b(0x102, 0xffffff, "little"), b"\x02\x01\x00")
 
     def test_bytes_to_number(self):
         b2n = util.bytes_to_number
@@ -48,7 +49,11 @@ class Utils(unittest.TestCase):
         self.assertEqual(b2n(b"\xff\xff"), 0xffff)
         self.assertEqual(b2n(b"\x01\x00\x00"), 0x010000)
         self.assertEqual(b2n(b"\x00\x00\x00\x01"), 0x01)
+        self.assertEqual(b2n(bytearray(b"\x01\x02")), 0x0102)
+        self.assertEqual(b2n(memoryview(b"\x00\x01\x02")[1:]), 0x0102)
+        self.assertEqual(b2n(b"\x01\x02", "little"), 0x0201)
         self.assertRaises(TypeError, b2n, 42)
+        self.assertRaises(TypeError, b2n, [1, 2])
         if type("") != type(b""):
             self.assertRaises(TypeError, b2n, "not bytes")
 
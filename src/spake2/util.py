@@ -1,4 +1,4 @@
-import os, binascii, math
+import os, math
 
 def size_bits(maxval):
     if hasattr(maxval, "bit_length"): # python-2.7 or 3.x
@@ -9,21 +9,20 @@ def size_bits(maxval):
 def size_bytes(maxval):
     return int(math.ceil(size_bits(maxval) / 8))
 
-def number_to_bytes(num, maxval):
+# Numbers are converted with int.to_bytes/int.from_bytes. bytes_to_number()
+# accepts anything that supports the buffer protocol (bytes, bytearray,
+# memoryview), and reads it in place, so callers can hand it a slice of a
+# receive buffer without copying it first.
+
+def number_to_bytes(num, maxval, byteorder="big"):
     if num > maxval:
         raise ValueError
-    num_bytes = size_bytes(maxval)
-    fmt_str = "%0" + str(2*num_bytes) + "x"
-    s_hex = fmt_str % num
-    s = binascii.unhexlify(s_hex.encode("ascii"))
-    assert len(s) == num_bytes
-    assert isinstance(s, type(b""))
-    return s
+    return num.to_bytes(size_bytes(maxval), byteorder)
 
-def bytes_to_number(s):
-    if not isinstance(s, type(b"")):
-        raise TypeError
-    return int(binascii.hexlify(s), 16)
+def bytes_to_number(s, byteorder="big"):
+    # memoryview() raises TypeError for anything that is not a buffer,
+    # including lists of ints (which int.from_bytes() would accept)
+    return int.from_bytes(memoryview(s), byteorder)
 
 def generate_mask(maxval):
     num_bytes = size_bytes(maxval)
@@ -62,12 +61,13 @@ def unbiased_randrange(start, stop, entropy_f):
     # first we get 0<=number<(stop-start)
     maxval = stop - start
 
-    top_byte_mask_int, num_bytes = generate_mask(maxval)
+    # (this is the same as masking the top byte of the big-endian string
+    # with generate_mask(), but without going through a list of ints)
+    num_bytes = size_bytes(maxval)
+    mask = (1 << size_bits(maxval)) - 1
     while True:
-        enough_bytes = random_list_of_ints(num_bytes, entropy_f)
+        enough_bytes = entropy_f(num_bytes)
         assert len(enough_bytes) == num_bytes
-        candidate_bytes = mask_list_of_ints(top_byte_mask_int, enough_bytes)
-        candidate_int = list_of_ints_to_number(candidate_bytes)
-        #print ["0x%02x" % b for b in candidate_bytes], candidate_int
+        candidate_int = int.from_bytes(enough_bytes, "big") & mask
         if candidate_int < maxval:
             return start + candidate_int